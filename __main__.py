@@ -4,12 +4,16 @@
 
 import os.path as osp, os
 import argparse
-from itertools import product
 from icecream import ic
 import logging
-from datetime import datetime
 import pry
-from core.detectors import classify_typosquat
+from core.scan import scan, work_units, fingerprint, shard, parse_shard
+from core.sinks import open_sink, rollback, sink_format, SINKS
+from core.checkpoint import CheckpointStore
+from core.incremental import DeltaStore, load_or_build_index
+from core import semantic, segmentation
+from core.detectors import parse_detector_keys, set_scope_index
+from core.scopes import ScopeIndex
 
 
 def make_argparser() -> argparse.ArgumentParser:
@@ -19,6 +23,22 @@ def make_argparser() -> argparse.ArgumentParser:
     parser.add_argument('--base_file', '-bf', action='store_const', const=True, help='specify that base names is path to list of pkgs')
     parser.add_argument('--adv_file', '-af', action='store_const', const=True, help='specify that adv names is path to list of pkgs')
     parser.add_argument('--outfile_path', '-of', help='specify that file is path to output')
+    parser.add_argument('--exhaustive', '-ex', action='store_const', const=True, help='check every base x adv pair instead of indexed candidates only')
+    parser.add_argument('--format', '-fmt', choices=sorted(SINKS), help='output file format, inferred from the outfile extension by default')
+    parser.add_argument('--quiet', '-q', action='store_const', const=True, help='do not print every positive pair')
+    parser.add_argument('--detectors', '-d', help='comma separated keys of the detectors to run, e.g. 1,3,7 (all by default)')
+    parser.add_argument('--early_exit', '-ee', action='store_const', const=True, help='stop at the first positive detector of a pair, cheapest first')
+    parser.add_argument('--skip_expensive', '-se', action='store_const', const=True, help='skip the expensive (semantic) detectors once a cheaper one is positive')
+    parser.add_argument('--segmenter', '-seg', choices=segmentation.SEGMENTERS, help='how delimiter-less names are split into tokens (default greedy)')
+    parser.add_argument('--vectors', '-vec', help='path to the saved fastText KeyedVectors (default core/models/fasttext-vectors.kv)')
+    parser.add_argument('--workers', '-w', type=int, default=1, help='number of forked worker processes')
+    parser.add_argument('--chunk_size', '-cs', type=int, default=1000, help='number of pairs sent to a worker at a time')
+    parser.add_argument('--shard', '-sh', help='only run slice i/N of the pairs, e.g. 3/100 (0 <= i < N)')
+    parser.add_argument('--unit_size', '-us', type=int, default=1000, help='number of adv pkgs per checkpointed work unit')
+    parser.add_argument('--checkpoint', '-cp', help='path to checkpoint store recording finished work units')
+    parser.add_argument('--resume', '-r', action='store_const', const=True, help='skip the work units already finished in the checkpoint store')
+    parser.add_argument('--index', '-ix', help='path to the persisted candidate index of the base pkgs, built on first use and whenever they change')
+    parser.add_argument('--delta', '-dl', help='path to delta store: the adv file is an append-only feed, only the names added since the last run are classified and appended to the outfile')
     return parser
 
 
@@ -30,6 +50,37 @@ def main():
     base_file: bool = args.base_file
     adv_file: bool = args.adv_file
     outfile_path: str = args.outfile_path
+    exhaustive: bool = args.exhaustive
+    fmt: str = args.format
+    quiet: bool = args.quiet
+    workers: int = args.workers
+    chunk_size: int = args.chunk_size
+    unit_size: int = args.unit_size
+    checkpoint_path: str = args.checkpoint
+    resume: bool = args.resume
+    index_path: str = args.index
+    delta_path: str = args.delta
+    early_exit: bool = bool(args.early_exit)
+    skip_expensive: bool = bool(args.skip_expensive)
+    try:
+        shard_spec = parse_shard(args.shard) if args.shard else None
+        detectors = parse_detector_keys(args.detectors) if args.detectors else None
+    except ValueError as e:
+        argparser.error(str(e))
+    if args.vectors:
+        semantic.set_model_path(args.vectors)
+    if args.segmenter:
+        segmentation.set_segmenter(args.segmenter)
+    if resume and not checkpoint_path:
+        argparser.error('--resume requires --checkpoint')
+    if resume and outfile_path and sink_format(outfile_path, fmt) == 'parquet':
+        argparser.error('parquet output cannot be appended to, use jsonl or csv to resume')
+    if delta_path and not (base_file and adv_file):
+        argparser.error('--delta requires --base_file and --adv_file')
+    if delta_path and (checkpoint_path or args.shard or exhaustive):
+        argparser.error('--delta cannot be combined with --checkpoint, --shard or --exhaustive')
+    if delta_path and outfile_path and sink_format(outfile_path, fmt) == 'parquet':
+        argparser.error('parquet output cannot be appended to, use jsonl or csv for delta scans')
 
     logging.basicConfig(filename="logs/run.log", filemode='a', level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
     logging.info("Typomind Detector Starting ....")
@@ -41,34 +92,78 @@ def main():
         with open(base_pkg_spec, 'r') as f:
             base_pkgs = {pkg.strip() for pkg in f}
     else: base_pkgs = {base_pkg_spec}
-    if adv_file:
+    delta = None
+    if delta_path:
+        assert osp.isfile(adv_pkg_spec)
+        delta = DeltaStore(delta_path, fingerprint(base_pkgs, (), sorted(detectors or []), early_exit, skip_expensive, segmentation.SEGMENTER))
+        new_pkgs, last_offset = delta.read_new(adv_pkg_spec)
+        adv_pkgs = set(new_pkgs)
+        logging.info(f"Delta scan of {len(adv_pkgs)} new adv pkgs (feed bytes {delta.high_water_mark()} to {last_offset})")
+        if outfile_path and delta.output_size() is not None:
+            rollback(outfile_path, delta.output_size())  # results of a run which never advanced the mark
+    elif adv_file:
         assert osp.isfile(adv_pkg_spec)
         with open(adv_pkg_spec, 'r') as f:
             adv_pkgs = {pkg.strip() for pkg in f}
     else: adv_pkgs = {adv_pkg_spec}
+    if shard_spec:
+        base_pkgs, adv_pkgs = shard(base_pkgs, adv_pkgs, *shard_spec)
+        logging.info(f"Running shard {args.shard}: {len(base_pkgs)} base x {len(adv_pkgs)} adv pkgs")
     count = 0
-    
-    for base_pkg, adv_pkg in product(base_pkgs, adv_pkgs):
-        start_time = datetime.now()
-        try:
-            classifications = {name: c for (_, name), c in classify_typosquat(base_pkg, adv_pkg).items()}
-            if classifications:
-                if outfile_path:
-                    with open(outfile_path, 'a') as file:
-                        end_time = datetime.now()
-                        file.write(f'(\'{base_pkg}\', \'{adv_pkg}\'): {classifications}, {format(end_time - start_time)}')
-                        file.write('\n')
-                end_time = datetime.now()
-                print(f'(\'{base_pkg}\', \'{adv_pkg}\'): {classifications}, {format(end_time - start_time)}')
-        except Exception as e:
-            end_time = datetime.now()
-            logging.error(f"Unhandled exception for base: {base_pkg}  and adv: {adv_pkg}. {format(end_time - start_time)}, Error{e}, ")
-            continue
-        count += 1
 
-        if count % 100000 == 0:
-            logging.info(f"Packages checked: {count}")
+    exhaustive = exhaustive or not (base_file or adv_file)
+    checkpoint = None
+    finished = set()
+    if checkpoint_path:
+        checkpoint = CheckpointStore(checkpoint_path, fingerprint(base_pkgs, adv_pkgs, unit_size, exhaustive, sorted(detectors or []), early_exit, skip_expensive, segmentation.SEGMENTER), resume = resume)
+        finished = checkpoint.finished_units()
+        count = checkpoint.num_finished_pairs()
+        if finished: logging.info(f"Resuming, skipping {len(finished)} finished units ({count} pairs)")
+        if resume and outfile_path and checkpoint.output_size() is not None:
+            rollback(outfile_path, checkpoint.output_size())  # results of units which never finished
+    index = load_or_build_index(index_path, base_pkgs, detectors) if index_path and not exhaustive else None
+    if detectors is None or 11 in detectors:  # relates each scope to the base scopes once, before the workers fork
+        set_scope_index(ScopeIndex(base_pkgs))
+    units = work_units(base_pkgs, adv_pkgs, unit_size = unit_size, exhaustive = exhaustive, skip = finished, detectors = detectors, index = index)
+
+    if checkpoint: append = resume  # a fresh checkpointed scan starts a fresh output
+    else: append = outfile_path is not None and sink_format(outfile_path, fmt) != 'parquet'
+    sink = open_sink(outfile_path, fmt, append = append) if outfile_path else None
+    if checkpoint and sink and not resume:
+        sink.sync()
+        checkpoint.record_output_size(osp.getsize(outfile_path))
+    if delta and sink:
+        sink.sync()
+        delta.record_output_size(osp.getsize(outfile_path))
+    total_hits = 0
+    for unit_id, num_pairs, results in scan(units, workers = workers, chunk_size = chunk_size,
+            detectors = detectors, early_exit = early_exit, skip_expensive = skip_expensive):
+        hits = 0
+        for result in results:
+            base_pkg, adv_pkg, classifications, elapsed, error = result
+            if error is not None:
+                logging.error(f"Unhandled exception for base: {base_pkg}  and adv: {adv_pkg}. {format(elapsed)}, Error{error}, ")
+                num_pairs -= 1
+                continue
+            hits += 1
+            if sink: sink.write(result)
+            if not quiet:
+                categories = {name: c for (_, name), c in classifications.items()}
+                print(f'(\'{base_pkg}\', \'{adv_pkg}\'): {categories}, {format(elapsed)}')
+        total_hits += hits
+        if checkpoint:
+            if sink: sink.sync()  # a unit is only marked finished once its results are on disk
+            checkpoint.mark_finished(unit_id, num_pairs, hits, output_size = osp.getsize(outfile_path) if sink else None)
+
+        if (count + num_pairs) // 100000 > count // 100000:
+            logging.info(f"Packages checked: {count + num_pairs}")
+        count += num_pairs
 
+    if sink: sink.close()
+    if checkpoint: checkpoint.close()
+    if delta:  # the mark only advances once the results are on disk
+        delta.advance(last_offset, count, total_hits, output_size = osp.getsize(outfile_path) if sink else None)
+        delta.close()
     print("Total product: ", count)
 
 
@@ -0,0 +1,104 @@
+"""
+Batch classification: classify_typosquat over arrays of pairs with columnar results.
+
+This is a columnar wrapper, not a vectorized classifier: every detector is still called once per pair, exactly as
+classify_typosquat calls it. What the batch adds is the result layout, one count matrix per batch instead of a dict per
+pair, with masks, bitmasks and a DataFrame view for downstream filtering. Row i of the matrix is the pair
+(base_pkgs[i], adversarial_pkgs[i]) and holds the same counts classify_typosquat would return for it.
+"""
+
+from typing import Collection, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from core.detectors import DetectorBase, EXPENSIVE_COST, by_cost, is_unscoped
+from core.normalizers import NormalizedPair
+from core.profiles import get_profile, get_name
+
+MAX_NAME_LEN = 35  # classify_typosquat ignores longer names
+
+
+class BatchResult(NamedTuple):
+    base_pkgs: np.ndarray  # object array of names, one per pair
+    adversarial_pkgs: np.ndarray
+    keys: np.ndarray  # detector key of each column of counts
+    names: List[str]  # detector name of each column of counts
+    counts: np.ndarray  # (pairs, detectors) int32
+    errors: Dict[int, str]  # row -> error of the pairs whose classification raised, their counts are 0
+
+    @property
+    def mask(self) -> np.ndarray:
+        """(pairs, detectors) bool, True where the detector is positive."""
+        return self.counts > 0
+
+    @property
+    def bitmask(self) -> np.ndarray:
+        """Positive detectors of every pair as bits, bit k set for detector key k."""
+        return (self.mask.astype(np.int64) << self.keys.astype(np.int64)).sum(axis = 1)
+
+    @property
+    def positive(self) -> np.ndarray:
+        """Rows with at least one positive detector."""
+        return np.flatnonzero(self.counts.any(axis = 1))
+
+    def classifications(self, row: int) -> Dict[tuple, int]:
+        """Counts of row in the format of classify_typosquat."""
+        return {(int(k), n): int(c) for k, n, c in zip(self.keys, self.names, self.counts[row]) if c}
+
+    def to_frame(self):
+        """pandas DataFrame with base_pkg, adv_pkg and one count column per detector name."""
+        import pandas as pd
+        frame = pd.DataFrame(self.counts, columns = self.names)
+        frame.insert(0, 'adv_pkg', self.adversarial_pkgs)
+        frame.insert(0, 'base_pkg', self.base_pkgs)
+        return frame
+
+
+def classify_typosquat_batch(base_pkgs: Sequence[str], adversarial_pkgs: Sequence[str], detectors: Optional[Collection[int]] = None,
+        early_exit: bool = False, skip_expensive: bool = False) -> BatchResult:
+    """classify_typosquat of every pair (base_pkgs[i], adversarial_pkgs[i]), with the same options, one detector call
+    per pair and detector."""
+    if len(base_pkgs) != len(adversarial_pkgs):
+        raise ValueError(f'got {len(base_pkgs)} base and {len(adversarial_pkgs)} adversarial packages')
+    # detectors both enabled and scoped have an instance in each registry, one column per key
+    registry = by_cost({d.key: d for d in DetectorBase.enabled_inst_registry | DetectorBase.scoped_inst_registry
+                        if detectors is None or d.key in detectors}.values())
+    base_names = np.array([get_name(b) for b in base_pkgs], dtype = object)
+    adversarial_names = np.array([get_name(a) for a in adversarial_pkgs], dtype = object)
+    counts = np.zeros((len(base_names), len(registry)), dtype = np.int32)
+    errors = {}
+
+    profiles = {name: get_profile(name) for name in {*base_names, *adversarial_names}}
+    valid = np.array([0 < len(b) <= MAX_NAME_LEN and 0 < len(a) <= MAX_NAME_LEN
+                      for b, a in zip(base_names, adversarial_names)], dtype = bool)
+    unscoped = np.array([is_unscoped(b, a) for b, a in zip(base_names, adversarial_names)], dtype = bool)
+    positive = np.zeros(len(base_names), dtype = bool)
+    pairs = [NormalizedPair(profiles[b], profiles[a]) for b, a in zip(base_names, adversarial_names)]
+
+    for column, d in enumerate(registry):
+        # the registries classify_typosquat picks for unscoped and scoped pairs
+        rows = np.zeros(len(base_names), dtype = bool)
+        if d.enabled: rows |= unscoped
+        if d.is_scoped: rows |= ~unscoped
+        rows &= valid
+        if early_exit or (skip_expensive and d.cost >= EXPENSIVE_COST):
+            rows &= ~positive
+        for row in np.flatnonzero(rows):
+            try:
+                count = d.detect(pairs[row])
+            except Exception as e:
+                errors[row] = f'{e}'
+                valid[row] = False
+                counts[row] = 0
+                continue
+            if count:
+                counts[row, column] = count
+                positive[row] = True
+
+    return BatchResult(base_names, adversarial_names, np.array([d.key for d in registry]), [d.name for d in registry], counts, errors)
+
+
+def classify_pairs_batch(pairs: Iterable[tuple], **classify_kwargs) -> BatchResult:
+    """classify_typosquat_batch of (base, adversarial) pairs."""
+    pairs = list(pairs)
+    return classify_typosquat_batch([b for b, _ in pairs], [a for _, a in pairs], **classify_kwargs)
@@ -0,0 +1,204 @@
+"""
+Candidate generation (blocking) for base x adversarial scans.
+
+Every base package is indexed under a handful of cheap keys, and an adversarial package is only paired with the base
+packages it shares at least one key with:
+    - del:      symmetric deletion neighborhoods (<= 2 deletions) of the delimiter-stripped name, of the sorted token
+                form and of the unscoped name; 1-step D-L dist, homographic replacement, scope confusion
+    - whole/
+      affix:    stripped name vs. its long prefixes/ suffixes; prefix/ suffix augmentation, simplification
+    - chars:    sorted characters of the stripped name; delimiter modification
+    - multiset: sorted canonical (british spelling, lemmatized) tokens; sequence reordering, grammatical substitution,
+                alternate spelling
+    - mask:     sorted canonical tokens with one token left out; single token substitutions
+    - tok:      any shared canonical token; semantic substitution of multi-token names
+    - sem:      a token of either name or one of its nearest corpus tokens (see core/neighbors.py); semantic
+                substitution of names sharing no token
+
+Sub-indexes add the base packages found by lookups of their own:
+    - EditDistanceIndex (see core/edit_index.py): within 2 edits of any token order of the adversarial name; 1-step
+      D-L dist of reordered tokens
+    - HomographIndex (see core/homographic.py): imitated by one homoglyph replacement; homographic replacement
+    - PhoneticIndex (see core/phonetic.py): the same other tokens and the phonetic key of one token; homophonic
+      similarity
+
+Pairs sharing no key and not found by a sub-index are never classified. Use itertools.product (`--exhaustive`) to
+check every pair. The sem keys need the token vectors of tools/build_token_vectors.py. Without them, and for similar
+tokens of which neither is among the SEMANTIC_NEIGHBORS nearest corpus tokens of the other, semantic substitutions
+sharing no token are missed.
+
+The token keys need the segmenter, so they are only built when a detector relying on them is selected. The
+HomographIndex finds every homographic replacement, so the edit keys are left out when it is the only detector run.
+"""
+
+import logging
+from collections import defaultdict
+from functools import lru_cache
+from itertools import combinations
+from typing import Collection, Dict, Iterable, Iterator, Optional, Set, Tuple
+
+from core import utils, tokens, nlp_tools, homographic, phonetic
+from core.edit_index import EditDistanceIndex
+from core.profiles import get_profile
+
+MAX_NAME_LEN = 35  # classify_typosquat ignores longer names
+SCOPE_CHARS = ('@', '/')
+TOKEN_KEY_DETECTORS = {5, 7, 8, 9, 10, 11, 13}  # detectors whose pairs may only share token keys
+SHARED_TOKEN_DETECTORS = {8, 11}
+EDIT_KEY_DETECTORS = {1, 3, 4, 5, 6, 7, 8, 9, 10, 11, 13}  # all but homographic replacement
+GLYPH_KEY_DETECTORS = {2}
+PHONETIC_KEY_DETECTORS = {13}
+SEMANTIC_KEY_DETECTORS = {8}
+SEMANTIC_NEIGHBORS = 50  # nearest corpus tokens indexed per base token
+INDEX_VERSION = 6  # bump whenever blocking keys are derived differently, persisted indexes are rebuilt
+
+
+def strip_delimiters(target: str) -> str:
+    """Removes every delimiter (and scope marker) from target."""
+    return ''.join(c for c in target if c not in utils.DELIMITERS and c not in SCOPE_CHARS)
+
+
+def unscoped(target: str) -> str:
+    """Name without its npm scope."""
+    return target.rsplit('/', 1)[-1]
+
+
+def deletion_neighborhood(target: str, max_deletes: int = 2) -> Set[str]:
+    """All strings reachable from target by deleting up to max_deletes characters."""
+    neighborhood = {target}
+    for n in range(1, min(max_deletes, len(target)) + 1):
+        for idxs in combinations(range(len(target)), n):
+            neighborhood.add(''.join(c for i, c in enumerate(target) if i not in idxs))
+    return neighborhood
+
+
+def affixes(target: str, min_ratio: float) -> Set[str]:
+    """Prefixes and suffixes of target which are at least min_ratio as long as target."""
+    min_len = max(1, int(len(target) * min_ratio))
+    return {target[:i] for i in range(min_len, len(target) + 1)} | {target[-i:] for i in range(min_len, len(target) + 1)}
+
+
+def canonical_token(token: str) -> str:
+    return nlp_tools.lemmatize(tokens.AM_TO_BR.get(token, token))
+
+
+def blocking_keys(target: str, max_deletes: int = 2, token_keys: bool = True, shared_tokens: bool = True,
+        edit_keys: bool = True) -> Set[Tuple[str, str]]:
+    """Symmetric keys, two names can only be confusable if they share at least one of them."""
+    keys = set()
+    if edit_keys:
+        stripped = strip_delimiters(target)
+        sorted_shallow = '_'.join(sorted(get_profile(target).shallow_sequence))
+        for form in {stripped, sorted_shallow, strip_delimiters(unscoped(target))}:
+            keys |= {('del', n) for n in deletion_neighborhood(form, max_deletes = max_deletes)}
+        keys.add(('chars', ''.join(sorted(stripped))))
+    if not token_keys: return keys
+
+    sequence = sorted(canonical_token(t) for t in get_profile(unscoped(target)).sequence)
+    keys.add(('multiset', '_'.join(sequence)))
+    if len(sequence) > 1:
+        keys |= {('mask', '_'.join(sequence[:i] + sequence[i + 1:])) for i in range(len(sequence))}
+        if shared_tokens:
+            keys |= {('tok', t) for t in sequence}
+    return keys
+
+
+@lru_cache(2**16)
+def similar_tokens(token: str) -> Set[str]:
+    """Nearest corpus tokens of token which may substitute it (see semantic.is_semantically_similar)."""
+    from core import neighbors  # loads numpy and the vectors, only when semantic keys are built
+    return {t for t, _ in neighbors.semantic_neighbors(token, k = SEMANTIC_NEIGHBORS)}
+
+
+def semantic_tokens(target: str) -> Set[str]:
+    """Tokens SemanticSubstitution compares, none for the names it skips."""
+    return set(get_profile(target).sequence) if len(target) >= 4 else set()
+
+
+def token_vectors_available() -> bool:
+    from core import neighbors
+    return neighbors.available()
+
+
+@lru_cache(1)
+def _warn_without_token_vectors() -> None:
+    """Once per process, every ScopeIndex builds a CandidateIndex per scope."""
+    logging.warning('No token vectors (see tools/build_token_vectors.py), semantic substitutions of names sharing no '
+                    'token are not paired')
+
+
+class CandidateIndex:
+    """Inverted index from blocking keys to base packages."""
+
+    def __init__(self, base_pkgs: Iterable[str] = (), max_deletes: int = 2, detectors: Optional[Collection[int]] = None) -> None:
+        """detectors: keys of the detectors which will be run, all by default."""
+        self.max_deletes = max_deletes
+        self.token_keys = detectors is None or bool(TOKEN_KEY_DETECTORS & set(detectors))
+        self.shared_tokens = detectors is None or bool(SHARED_TOKEN_DETECTORS & set(detectors))
+        self.edit_keys = detectors is None or bool(EDIT_KEY_DETECTORS & set(detectors))
+        self.glyph_keys = detectors is None or bool(GLYPH_KEY_DETECTORS & set(detectors))
+        self.phonetic_keys = detectors is None or bool(PHONETIC_KEY_DETECTORS & set(detectors))
+        self.semantic_keys = detectors is None or bool(SEMANTIC_KEY_DETECTORS & set(detectors))
+        if self.semantic_keys and not token_vectors_available():
+            _warn_without_token_vectors()
+            self.semantic_keys = False
+        self.index: Dict[Tuple[str, str], Set[str]] = defaultdict(set)
+        self.edits = EditDistanceIndex(max_dist = max_deletes) if self.edit_keys else None
+        self.homographs = homographic.HomographIndex() if self.glyph_keys else None
+        self.phonetics = phonetic.PhoneticIndex() if self.phonetic_keys else None
+        for base_pkg in base_pkgs:
+            self.add(base_pkg)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def _keys(self, target: str) -> Set[Tuple[str, str]]:
+        return blocking_keys(target, max_deletes = self.max_deletes, token_keys = self.token_keys, shared_tokens = self.shared_tokens,
+                             edit_keys = self.edit_keys)
+
+    def add(self, base_pkg: str) -> None:
+        if not base_pkg or len(base_pkg) > MAX_NAME_LEN: return
+        for key in self._keys(base_pkg):
+            self.index[key].add(base_pkg)
+        stripped = strip_delimiters(base_pkg)
+        self.index[('whole', stripped)].add(base_pkg)
+        for affix in affixes(stripped, min_ratio = 0.4):  # simplification allows the base to be 2.5x as long
+            self.index[('affix', affix)].add(base_pkg)
+        if self.edits is not None:
+            self.edits.add(base_pkg)
+        if self.homographs is not None:
+            self.homographs.add(base_pkg)
+        if self.phonetics is not None:
+            self.phonetics.add(base_pkg)
+        if self.semantic_keys:
+            for token in semantic_tokens(base_pkg):
+                for similar in {token} | similar_tokens(token):
+                    self.index[('sem', similar)].add(base_pkg)
+
+    def candidates(self, adv_pkg: str) -> Set[str]:
+        """Base packages which adv_pkg may be confusable with."""
+        if not adv_pkg or len(adv_pkg) > MAX_NAME_LEN: return set()
+        stripped = strip_delimiters(adv_pkg)
+        keys = self._keys(adv_pkg)
+        keys |= {('whole', affix) for affix in affixes(stripped, min_ratio = 0.5)}  # augmentation at most doubles
+        keys.add(('affix', stripped))
+        if self.semantic_keys:
+            for token in semantic_tokens(adv_pkg):
+                keys |= {('sem', similar) for similar in {token} | similar_tokens(token)}
+        found = self.edits.one_step_candidates(adv_pkg) if self.edits is not None else set()
+        if self.homographs is not None:
+            found |= self.homographs.imitated(adv_pkg)
+        if self.phonetics is not None:
+            found |= self.phonetics.candidates(adv_pkg)
+        for key in keys:
+            if key in self.index:
+                found |= self.index[key]
+        return found
+
+
+def candidate_pairs(base_pkgs: Iterable[str], adv_pkgs: Iterable[str], **index_kwargs) -> Iterator[Tuple[str, str]]:
+    """Drop-in replacement for itertools.product(base_pkgs, adv_pkgs) which skips pairs that cannot match."""
+    index = CandidateIndex(base_pkgs, **index_kwargs)
+    for adv_pkg in adv_pkgs:
+        for base_pkg in sorted(index.candidates(adv_pkg)):
+            yield base_pkg, adv_pkg
@@ -0,0 +1,58 @@
+"""
+Local checkpoint store recording which work units (see core/scan.py) of a scan have finished.
+
+Along with every finished unit the store records the size of the output file at that point, so a resumed scan first
+drops the records of the units which were written but never marked finished.
+"""
+
+import sqlite3
+from datetime import datetime
+from typing import Optional, Set
+
+
+class CheckpointStore:
+    def __init__(self, path: str, fingerprint: str, resume: bool = False) -> None:
+        self.path = path
+        self.con = sqlite3.connect(path)
+        self.con.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        self.con.execute('CREATE TABLE IF NOT EXISTS units (unit INTEGER PRIMARY KEY, pairs INTEGER, hits INTEGER, finished_at TEXT)')
+        stored = self.con.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+        if resume and stored and stored[0] != fingerprint:
+            raise ValueError(f'"{path}" was written by a scan with different inputs or options, cannot resume')
+        if not resume:
+            self.con.execute('DELETE FROM units')
+            self.con.execute("INSERT OR REPLACE INTO meta VALUES ('output_size', NULL)")
+        self.con.execute("INSERT OR REPLACE INTO meta VALUES ('fingerprint', ?)", (fingerprint,))
+        self.con.commit()
+
+    def __enter__(self) -> 'CheckpointStore':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def finished_units(self) -> Set[int]:
+        return {unit for unit, in self.con.execute('SELECT unit FROM units')}
+
+    def num_finished_pairs(self) -> int:
+        return self.con.execute('SELECT COALESCE(SUM(pairs), 0) FROM units').fetchone()[0]
+
+    def output_size(self) -> Optional[int]:
+        """Size of the output file when the last unit was marked finished, None if unknown."""
+        size = self.con.execute("SELECT value FROM meta WHERE key = 'output_size'").fetchone()
+        return None if size is None or size[0] is None else int(size[0])
+
+    def mark_finished(self, unit_id: int, num_pairs: int, num_hits: int, output_size: Optional[int] = None) -> None:
+        """output_size: size of the output file with all results of the unit synced."""
+        self.con.execute('INSERT OR REPLACE INTO units VALUES (?, ?, ?, ?)', (unit_id, num_pairs, num_hits, datetime.now().isoformat()))
+        if output_size is not None:
+            self.con.execute("INSERT OR REPLACE INTO meta VALUES ('output_size', ?)", (output_size,))
+        self.con.commit()
+
+    def record_output_size(self, output_size: int) -> None:
+        """Size of a freshly opened output file, before any unit finished."""
+        self.con.execute("INSERT OR REPLACE INTO meta VALUES ('output_size', ?)", (output_size,))
+        self.con.commit()
+
+    def close(self) -> None:
+        self.con.close()
@@ -22,21 +22,32 @@ Notes:
 """
 
 from abc import ABCMeta, abstractmethod
+from collections import defaultdict
 from faulthandler import is_enabled
-from itertools import permutations
-from jellyfish import soundex, metaphone
-from typing import List, Dict
+from functools import lru_cache
+from typing import Collection, Iterable, Iterator, List, Dict, Optional, Set, Tuple, Union
 
 from icecream import ic
 
-from core import utils, homographic
+from core import utils, homographic, phonetic
 from core import nlp_tools
 from core import tokens
 from core import normalizers
 from core import semantic
+from core.profiles import PackageProfile, get_profile
 try: import pry
 except ModuleNotFoundError: pass
 
+# detectors costing at least this many us/pair (see tools/profile_detectors.py) are skipped by skip_expensive
+EXPENSIVE_COST = 100
+
+# heavy resources a detector may need, each loaded on first use
+RESOURCE_LOADERS = {
+    'corpora': tokens.load,  # token corpora, needed by segmentation
+    'wordnet': nlp_tools.get_lemmatizer,
+    'vectors': semantic.get_word_vector,  # fastText
+}
+
 class DetectorBase(metaclass = ABCMeta):
     cls_registry = {}
     enabled_inst_registry = set()
@@ -47,6 +58,12 @@ class DetectorBase(metaclass = ABCMeta):
             cls.enabled = True
         if not hasattr(cls, 'is_scoped'):
             cls.is_scoped = False
+        if not hasattr(cls, 'resources'):
+            cls.resources = frozenset()
+        if not hasattr(cls, 'cost'):
+            cls.cost = 1
+        if not set(cls.resources) <= set(RESOURCE_LOADERS):
+            raise TypeError(f'{cls} requires unknown resources {set(cls.resources) - set(RESOURCE_LOADERS)}')
         if not hasattr(cls, 'name'):
             raise TypeError(f'{cls} needs a static "name" attribute')
         if not hasattr(cls, 'key'):
@@ -61,6 +78,13 @@ class DetectorBase(metaclass = ABCMeta):
     def __call__(self, base_pkg: str, adversarial_pkg: str, *normalized_detectors) -> int:
         raise NotImplementedError
 
+    def detect(self, pair: normalizers.NormalizedPair) -> int:
+        """Same as calling the detector on the pair, but takes the normalized names from the outputs shared by pair."""
+        call = type(self).__call__
+        stages = getattr(call, 'stages', None)
+        if stages is None: return self(pair.base_pkg, pair.adversarial_pkg)
+        return call.__wrapped__(self, *pair.stage(stages))
+
 def is_unscoped(base_pkg: str, adversarial_pkg: str):
     bp = base_pkg.split('/')
     ap = adversarial_pkg.split('/')
@@ -71,20 +95,89 @@ def is_unscoped(base_pkg: str, adversarial_pkg: str):
         return False
 
 
-def classify_typosquat(base_pkg: str, adversarial_pkg: str) -> Dict[str, int]:
-    if not base_pkg or not adversarial_pkg or len(base_pkg) == 0  or len(adversarial_pkg) == 0: return {}
+def parse_detector_keys(spec: str) -> Set[int]:
+    """Parses a comma separated list of detector keys, e.g. "1,3,7"."""
+    try:
+        keys = {int(k) for k in spec.split(',') if k.strip()}
+    except ValueError:
+        raise ValueError(f'"{spec}" is not a comma separated list of detector keys')
+    unknown = keys - set(DetectorBase.cls_registry)
+    if unknown:
+        raise ValueError(f'unknown detector keys {sorted(unknown)}, expected some of {sorted(DetectorBase.cls_registry)}')
+    return keys
+
+
+def required_resources(detectors: Optional[Collection[int]] = None) -> Set[str]:
+    """Resources needed by the given detector keys (all enabled detectors by default)."""
+    return {r for d in DetectorBase.enabled_inst_registry | DetectorBase.scoped_inst_registry
+            if detectors is None or d.key in detectors for r in d.resources}
+
+
+def load_resources(resources: Collection[str]) -> None:
+    """Loads resources ahead of time, e.g. before forking workers so they share them."""
+    for resource in resources:
+        RESOURCE_LOADERS[resource]()
+
+
+def by_cost(registry: Set[DetectorBase]) -> List[DetectorBase]:
+    """Cheapest detectors first."""
+    return sorted(registry, key = lambda d: (d.cost, d.key))
+
+
+def classify_typosquat(base_pkg: Union[str, PackageProfile], adversarial_pkg: Union[str, PackageProfile],
+        detectors: Optional[Collection[int]] = None, early_exit: bool = False, skip_expensive: bool = False) -> Dict[str, int]:
+    """Accepts names or their profiles, the detectors share the (cached) profile of each name and the normalized forms of
+    the pair (see normalizers.NormalizedPair).
+
+    detectors restricts the run to the given detector keys, the resources of the others are never loaded. Detectors run
+    cheapest first: with early_exit only the first positive detector is returned, with skip_expensive the expensive
+    ones (cost >= EXPENSIVE_COST) are skipped once a cheaper one is positive.
+    """
+    if not base_pkg or not adversarial_pkg: return {}
+    base_profile, adversarial_profile = get_profile(base_pkg), get_profile(adversarial_pkg)
+    base_pkg, adversarial_pkg = base_profile.name, adversarial_profile.name
+    if len(base_pkg) == 0  or len(adversarial_pkg) == 0: return {}
     if len(base_pkg) > 35 or len(adversarial_pkg) > 35: return{}
-    if is_unscoped(base_pkg, adversarial_pkg):
-        detector_count = {(d.key, d.name): d(base_pkg, adversarial_pkg) for d in DetectorBase.enabled_inst_registry}
-    else:
-        detector_count = {(d.key, d.name): d(base_pkg, adversarial_pkg) for d in DetectorBase.scoped_inst_registry}
-    return {_: c for _, c in detector_count.items() if c}
+    registry = ENABLED_BY_COST if is_unscoped(base_pkg, adversarial_pkg) else SCOPED_BY_COST
+    detector_count = {}
+    pair = normalizers.NormalizedPair(base_profile, adversarial_profile)
+    for d in registry:
+        if detectors is not None and d.key not in detectors: continue
+        if skip_expensive and detector_count and d.cost >= EXPENSIVE_COST: break
+        count = d.detect(pair)
+        if count:
+            detector_count[(d.key, d.name)] = count
+            if early_exit: break
+    return detector_count
+
+@lru_cache(2**16)
+def are_confusable(base_pkg: str, adversarial_pkg: str) -> bool:
+    """Whether any detector is positive for the pair, cached since ScopeConfusion compares the same few npm scopes over
+    and over (see core/scopes.py for an index of them)."""
+    return bool(classify_typosquat(base_pkg, adversarial_pkg, early_exit = True))
+
+_scope_index = None  # see set_scope_index
+
+
+def set_scope_index(index) -> None:
+    """Lets ScopeConfusion look the scopes of the base packages up in index (a core.scopes.ScopeIndex), e.g. before
+    forking workers. None restores classifying every pair of scopes."""
+    global _scope_index
+    _scope_index = index
+
+
+def are_confusable_scopes(base_scope: str, adversarial_scope: str) -> bool:
+    """Read off the relations of the scope index if it indexes base_scope, else classified."""
+    if _scope_index is not None and base_scope in _scope_index.base_scopes:
+        return base_scope in _scope_index.related_scopes(adversarial_scope)
+    return are_confusable(base_scope, adversarial_scope)
 
 class AsemanticSubstitution(DetectorBase):
     key, name = (9, 'asemantic substitution')
+    cost = 100
+    resources = {'corpora', 'wordnet', 'vectors'}
     
-    @normalizers.normalize_one_step_LD_dist
-    @normalizers.normalize_delimiters
+    @normalizers.normalize('one_step_LD_dist', 'delimiters')
     def __call__(self, base_pkg: str, adversarial_pkg: str, *normalized_detectors) -> int:
         # if len(normalized_detectors) > 0 and '1-step-dl' in normalized_detectors[0].keys():
         #     print(f"{base_pkg}, {adversarial_pkg}: 1-step-dl + asemantic substitution")
@@ -95,8 +188,9 @@ class AsemanticSubstitution(DetectorBase):
 
 class HomographicReplacement(DetectorBase):
     key, name = (2, 'homographic replacement')
+    cost = 45
     
-    @normalizers.normalize_delimiters
+    @normalizers.normalize('delimiters')
     def __call__(self, base_pkg: str, adversarial_pkg: str) -> int:
         normalized_base = base_pkg.replace('_', '')
         normalized_adversarial = adversarial_pkg.replace('_', '')
@@ -106,30 +200,26 @@ class HomographicReplacement(DetectorBase):
 
 class OneStepLDDist(DetectorBase):
     key, name = (1, '1-step D-L dist')
+    cost = 16
 
-    @normalizers.normalize_sequence_order(deep = False)
-    @normalizers.normalize_delimiters
+    @normalizers.normalize('shallow_sequence_order', 'delimiters')
     def __call__(self, base_pkg: str, adversarial_pkg: str,
                     min_dist: int = 4, min_two_step_dist: int = 5) -> int:
         if len(base_pkg) < min_dist or len(adversarial_pkg) < min_dist: return 0
         if ''.join(base_pkg.split('-')) == ''.join(adversarial_pkg.split('-')): return 0
-        for p in permutations(adversarial_pkg.split('_')): 
-            
-            dist = utils.DL_dist(base_pkg, '_'.join(p))
-            if (len(base_pkg) < min_two_step_dist or len(adversarial_pkg) < min_two_step_dist) and dist == 2:
-                return 0
-            if dist in {1, 2}: return dist
-        dist = utils.DL_dist(base_pkg, adversarial_pkg)
+        # distance to the first reordering of the adversarial tokens within 2 steps
+        dist = utils.permuted_DL_dist(base_pkg, adversarial_pkg.split('_'), max_dist = 2)
         if (len(base_pkg) < min_two_step_dist or len(adversarial_pkg) < min_two_step_dist) and dist == 2:
             return 0
-        return dist if dist in {1, 2} else 0
+        return dist
 
 class ScopeConfusion(DetectorBase):
     key, name = (11, 'scope confusion')
+    cost = 10
+    resources = {'corpora', 'wordnet', 'vectors'}  # classifies the scopes with every detector
     is_scoped = True
 
-    @normalizers.normalize_one_step_LD_dist
-    @normalizers.normalize_delimiters
+    @normalizers.normalize('one_step_LD_dist', 'delimiters')
     def __call__(self, base_pkg: str, adversarial_pkg: str, *normalized_detectors) -> int:
         # if len(normalized_detectors) > 0 and '1-step-dl' in normalized_detectors[0].keys():
         #     print(f"{base_pkg}, {adversarial_pkg}: 1-step-dl + scope confusion")
@@ -156,8 +246,7 @@ class ScopeConfusion(DetectorBase):
                 if len(adversarial_scope) == 0 and len(base_scope) != 0:
                     is_scope_confusion = True 
 
-                classifications = classify_typosquat(base_scope, adversarial_scope)
-                if classifications:
+                if base_scope and adversarial_scope and are_confusable_scopes(base_scope, adversarial_scope):
                     is_scope_confusion = True
 
             # Case 2:
@@ -174,13 +263,15 @@ class ScopeConfusion(DetectorBase):
 
 class SequenceReordering(DetectorBase):
     key, name = (7, 'sequence reordering')
+    cost = 3
+    resources = {'corpora', 'wordnet'}
 
     # @normalizers.normalize_one_step_LD_dist
     # @normalizers.normalize_grammar
     def __call__(self, base_pkg: str, adversarial_pkg: str) -> int:
         # implicitly normalizes delimiters
-        base_sequence = utils.to_sequence(base_pkg)
-        adversarial_sequence = utils.to_sequence(adversarial_pkg)
+        base_sequence = get_profile(base_pkg).sequence
+        adversarial_sequence = get_profile(adversarial_pkg).sequence
         if (base_sequence != adversarial_sequence) and (sorted(base_sequence) == sorted(adversarial_sequence)):
             return 1
         else:
@@ -189,27 +280,49 @@ class SequenceReordering(DetectorBase):
 
 class DelimiterModification(DetectorBase):
     key, name = (3, 'delimiter modification')
+    cost = 30
+    resources = {'corpora', 'wordnet'}
 
-    @normalizers.normalize_sequence_order
-    @normalizers.normalize_one_step_LD_dist
+    @normalizers.normalize('sequence_order', 'one_step_LD_dist')
     # @normalizers.normalize_grammar
     def __call__(self, base_pkg: str, adversarial_pkg: str, *normalized_detectors) -> int:
         # if len(normalized_detectors) > 0 and '1-step-dl' in normalized_detectors[0].keys():
         #     print(f"{base_pkg}, {adversarial_pkg}: 1-step-dl + delimiter modification")
 
-        base_sequence = utils.to_sequence(base_pkg)
-        base_seq_permutations = {''.join(element) for element in permutations(base_sequence)}
-        adversarial_sequence = utils.to_sequence(adversarial_pkg)
-        adversarial_seq_permuations = {''.join(element) for element in permutations(adversarial_sequence)}
-        matched = (''.join(adversarial_sequence) in base_seq_permutations) or (''.join(base_sequence) in adversarial_seq_permuations)
-        return 1 if matched and (base_pkg != adversarial_pkg) else 0
+        base_profile, adversarial_profile = get_profile(base_pkg), get_profile(adversarial_pkg)
+        if base_pkg == adversarial_pkg or base_profile.char_key != adversarial_profile.char_key: return 0
+        # the concatenation of one sequence must be that of a reordering of the other
+        matched = base_profile.joined == adversarial_profile.joined \
+            or utils.is_permuted_concatenation(adversarial_profile.joined, base_profile.sequence) \
+            or utils.is_permuted_concatenation(base_profile.joined, adversarial_profile.sequence)
+        return 1 if matched else 0
+
+
+def bucket_by_delimiter_key(pkgs: Iterable[str]) -> Dict[str, List[str]]:
+    """Groups pkgs by PackageProfile.char_key, the first thing DelimiterModification compares."""
+    buckets = defaultdict(list)
+    for pkg in pkgs:
+        buckets[get_profile(pkg).char_key].append(pkg)
+    return buckets
+
+
+def match_delimiter_modifications(base_pkgs: Iterable[str], adversarial_pkgs: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """Yields the (base, adversarial) delimiter modifications, with one bucket lookup per adversarial pkg instead of a
+    check per pair. Matches which only appear after the 1-step D-L normalization are missed, classify_typosquat finds those.
+    """
+    buckets = bucket_by_delimiter_key(base_pkgs)
+    detector = DelimiterModification()
+    for adversarial_pkg in adversarial_pkgs:
+        for base_pkg in buckets.get(get_profile(adversarial_pkg).char_key, ()):
+            if detector(base_pkg, adversarial_pkg): yield base_pkg, adversarial_pkg
 
 
 class PrefixSuffixAugmentation(DetectorBase):
     key, name = (4, 'prefix/ suffix augmentation')
+    cost = 10
+    resources = {'corpora', 'wordnet'}
 
-    @normalizers.normalize_one_step_LD_dist
-    @normalizers.normalize_delimiters
+    @normalizers.normalize('one_step_LD_dist', 'delimiters')
     # @normalizers.normalize_grammar
     def __call__(self, base_pkg: str, adversarial_pkg: str,  popularity_threshold: float = 0.15, *normalized_detectors) -> int:  # threshold 0.135 adds false negative, 0.145 is fine
         if len(base_pkg) < 3 or len(adversarial_pkg) < 3: return 0 # check for length of package name, 3
@@ -223,16 +336,16 @@ class PrefixSuffixAugmentation(DetectorBase):
         if base_pkg in adversarial_pkg and (len(normalized_adversarial) > len(normalized_base)) and (len(normalized_adversarial) <= (len(normalized_base) * 2)):
             starts_with_or_ends_with = adversarial_pkg.startswith(base_pkg) or adversarial_pkg.endswith(base_pkg)
 
-            if starts_with_or_ends_with and all((tokens.PKG_TOKEN_TO_RANK[seq] if seq in tokens.PKG_TOKEN_TO_RANK else 0) < popularity_threshold for seq in utils.to_sequence(base_pkg)):
+            if starts_with_or_ends_with and all((tokens.PKG_TOKEN_TO_RANK[seq] if seq in tokens.PKG_TOKEN_TO_RANK else 0) < popularity_threshold for seq in get_profile(base_pkg).sequence):
                 return 1
         return 0
 
 class Simplification(DetectorBase):
     key, name = (6, 'simplification')   
+    cost = 8
+    resources = {'corpora', 'wordnet'}
     
-    @normalizers.normalize_scope
-    @normalizers.normalize_one_step_LD_dist
-    @normalizers.normalize_delimiters
+    @normalizers.normalize('scope', 'one_step_LD_dist', 'delimiters')
     def __call__(self, base_pkg: str, adversarial_pkg: str, *normalized_detectors) -> int:
         # if len(normalized_detectors) > 0 and '1-step-dl' in normalized_detectors[0].keys():
         #     print(f"{base_pkg}, {adversarial_pkg}: 1-step-dl + simplification")
@@ -251,6 +364,8 @@ class Simplification(DetectorBase):
 
 class GrammaticalSubstitution(DetectorBase):
     key, name = (10, 'grammatical substitution')
+    cost = 12
+    resources = {'corpora', 'wordnet'}
 
     @staticmethod
     def basic_plural_case(base_pkg: str, adversarial_pkg: str) -> bool:
@@ -266,8 +381,7 @@ class GrammaticalSubstitution(DetectorBase):
             ((nlp_tools.lemmatize(base_token) == nlp_tools.lemmatize(adversarial_token)) or \
                 GrammaticalSubstitution.basic_plural_case(base_token, adversarial_token))
 
-    @normalizers.normalize_sequence_order
-    @normalizers.normalize_delimiters
+    @normalizers.normalize('sequence_order', 'delimiters')
     def __call__(self, base_pkg: str, adversarial_pkg: str) -> int:
         count = 0
         is_gramatical_substitution = False
@@ -286,17 +400,18 @@ class GrammaticalSubstitution(DetectorBase):
 
 class SemanticSubstitution(DetectorBase):
     key, name = (8, "semantic substitution")
+    cost = 200
+    resources = {'corpora', 'wordnet', 'vectors'}
     
     # @normalizers.normalize_sequence_order
-    @normalizers.normalize_one_step_LD_dist
-    @normalizers.normalize_delimiters
+    @normalizers.normalize('one_step_LD_dist', 'delimiters')
     def __call__(self, base_pkg: str, adversarial_pkg: str, *normalized_detectors) -> int:
         if len(base_pkg) < 4 or len(adversarial_pkg) < 4: return 0 # check for length of package name, 4
         # if len(normalized_detectors) > 0 and '1-step-dl' in normalized_detectors[0].keys():
         #     print(f"{base_pkg}, {adversarial_pkg}: 1-step-dl + semantic substitution")
 
-        base_tokens = utils.to_sequence(base_pkg)
-        adversarial_tokens = utils.to_sequence(adversarial_pkg)
+        base_tokens = list(get_profile(base_pkg).sequence)
+        adversarial_tokens = list(get_profile(adversarial_pkg).sequence)
         if adversarial_tokens == adversarial_pkg:
             adversarial_tokens = utils.segment(adversarial_pkg)
         semantically_similar = semantic.is_semantically_similar(base_tokens, adversarial_tokens)
@@ -304,12 +419,15 @@ class SemanticSubstitution(DetectorBase):
 
 class HomophonicSimilarity(DetectorBase):
     key, name = (13, 'homophonic similarity')
+    cost = 12
+    resources = {'corpora'}
     @staticmethod
     def is_similiar(base_token: str, adversarial_token: str) -> str:
-        return base_token != adversarial_token and soundex(base_token) == soundex(adversarial_token) and metaphone(base_token) == metaphone(adversarial_token) and base_token in tokens.corpora['all']
+        # corpus membership first, it rules out most tokens without computing any key
+        return base_token != adversarial_token and base_token in tokens.corpora['all'] and phonetic.phonetic_key(base_token) == phonetic.phonetic_key(adversarial_token)
 
     # @normalizers.normalize_sequence_order(deep = False)
-    @normalizers.normalize_delimiters
+    @normalizers.normalize('delimiters')
     def __call__(self, base_pkg: str, adversarial_pkg: str) -> int:
         if len(base_pkg) < 4 or len(adversarial_pkg) < 4: return 0 # check for length of package name, 4
 
@@ -333,6 +451,8 @@ class HomophonicSimilarity(DetectorBase):
 
 class AlternateSpelling(DetectorBase):
     key, name = (5, 'alternate spelling')
+    cost = 6
+    resources = {'corpora', 'wordnet'}
 
     @staticmethod
     def is_alternate(base_token: str, adv_token: str) -> str:
@@ -340,8 +460,7 @@ class AlternateSpelling(DetectorBase):
         adv_translation = tokens.AM_TO_BR[adv_token] if adv_token in tokens.AM_TO_BR else None
         return base_translation == adv_token or adv_translation == base_token
 
-    @normalizers.normalize_sequence_order
-    @normalizers.normalize_delimiters
+    @normalizers.normalize('sequence_order', 'delimiters')
     def __call__(self, base_pkg: str, adversarial_pkg: str) -> int:
         for base_token, adv_token in zip(base_pkg.split('_'), adversarial_pkg.split('_')):
             count = sum([int(AlternateSpelling.is_alternate(base_token, adv_token))])
@@ -353,3 +472,7 @@ class AlternateSpelling(DetectorBase):
                 return count if (base_segments_test == adversarial_segments_test) else 0
         
         return count
+
+
+ENABLED_BY_COST = by_cost(DetectorBase.enabled_inst_registry)
+SCOPED_BY_COST = by_cost(DetectorBase.scoped_inst_registry)
@@ -0,0 +1,80 @@
+"""
+Persistent cache of segmentations and lemmas, shared by every process on a machine.
+
+`tools/build_caches.py` fills it offline, e.g. for every popular package name and corpus token, so that runs and their
+forked workers start warm instead of segmenting and lemmatizing the same names again. The cache is a SQLite file opened
+read-only and memory-mapped. It is tagged with the corpus and segmenter signatures (see tokens.source_signature and
+segmentation.signature) and ignored once either changes, so a stale cache can never change results.
+"""
+
+import os.path as osp, os
+import sqlite3
+import tempfile
+from typing import Iterable, List, Optional, Tuple
+
+from core import tokens
+
+PATH = osp.dirname(osp.realpath(__file__))
+CACHE_PATH = osp.join(PATH, '..', 'data', 'token_sets', 'cache.sqlite')
+MMAP_SIZE = 2**30
+
+_connection = None
+_connection_pid = None
+
+
+def signature() -> str:
+    """Changes whenever a cached segmentation or lemma may be different."""
+    from core import segmentation  # imports this module
+    return f'{tokens.source_signature()}:{segmentation.signature()}'
+
+
+def _connect() -> Optional[sqlite3.Connection]:
+    """Read-only connection of this process, None if there is no cache for the current corpora.
+
+    Connections cannot be shared across a fork, so every worker opens its own on first use.
+    """
+    global _connection, _connection_pid
+    if _connection_pid == os.getpid(): return _connection
+    _connection, _connection_pid = None, os.getpid()
+    if not osp.isfile(CACHE_PATH): return None
+    con = sqlite3.connect(f'file:{CACHE_PATH}?mode=ro&immutable=1', uri = True, check_same_thread = False)
+    con.execute(f'PRAGMA mmap_size = {MMAP_SIZE}')
+    stored = con.execute("SELECT value FROM meta WHERE key = 'signature'").fetchone()
+    if stored is None or stored[0] != signature():
+        con.close()
+        return None
+    _connection = con
+    return _connection
+
+
+def cached_segmentation(target: str, segmenter: str) -> Optional[List[str]]:
+    con = _connect()
+    if con is None: return None
+    row = con.execute('SELECT tokens FROM segments WHERE segmenter = ? AND name = ?', (segmenter, target)).fetchone()
+    return row[0].split(' ') if row else None
+
+
+def cached_lemma(token: str) -> Optional[str]:
+    con = _connect()
+    if con is None: return None
+    row = con.execute('SELECT lemma FROM lemmas WHERE token = ?', (token,)).fetchone()
+    return row[0] if row else None
+
+
+def write_cache(segments: Iterable[Tuple[str, str, List[str]]], lemmas: Iterable[Tuple[str, str]], path: str = CACHE_PATH) -> None:
+    """Writes (segmenter, name, tokens) and (token, lemma) rows to a new cache, replacing path atomically."""
+    global _connection_pid
+    fd, tmp_path = tempfile.mkstemp(dir = osp.dirname(path), prefix = '.cache-')
+    os.close(fd)
+    con = sqlite3.connect(tmp_path)
+    con.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+    con.execute('CREATE TABLE segments (segmenter TEXT, name TEXT, tokens TEXT, PRIMARY KEY (segmenter, name)) WITHOUT ROWID')
+    con.execute('CREATE TABLE lemmas (token TEXT PRIMARY KEY, lemma TEXT) WITHOUT ROWID')
+    con.execute("INSERT INTO meta VALUES ('signature', ?)", (signature(),))
+    con.executemany('INSERT OR REPLACE INTO segments VALUES (?, ?, ?)', ((s, n, ' '.join(t)) for s, n, t in segments))
+    con.executemany('INSERT OR REPLACE INTO lemmas VALUES (?, ?)', lemmas)
+    con.commit()
+    con.close()
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+    _connection_pid = None  # reopen on next use
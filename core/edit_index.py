@@ -0,0 +1,133 @@
+"""
+Index answering "which names are within Damerau-Levenshtein distance k of this one" without comparing every pair.
+
+DL_dist is the optimal string alignment distance, which breaks the triangle inequality (DL_dist('ca', 'abc') is 3), so a
+BK-tree would miss matches. Instead the names are stored in a character trie which is walked with the distance table
+of the query, one row per trie edge: names sharing a prefix share its rows, and a branch is dropped as soon as its rows
+exceed k, so only a small part of the trie is visited.
+
+OneStepLDDist compares the sorted base tokens with every reordering of the adversarial tokens, which no single walk
+covers. For it the names are also indexed by token deletion keys: the tokens left after up to 2 deletions from the form
+(a deleted '_' joins two tokens), sorted. A reordering within 2 edits of a base form shares a key with it whatever the
+order of the tokens, so one_step_candidates is a few dictionary lookups. CandidateIndex (core/candidates.py) pairs the
+adversarial names with them, and is persisted along with them (see core/incremental.py).
+"""
+
+from collections import defaultdict
+from typing import Dict, Iterable, Set, Tuple
+
+from core.profiles import get_profile
+
+_NAMES = None  # key of the names ending at a trie node
+
+
+def one_step_form(target: str) -> str:
+    """The form OneStepLDDist compares: shallow tokens sorted, delimiters replaced by '_'."""
+    return get_profile(get_profile(target).shallow_sorted_tokens).delimited
+
+
+def _deletions(target: str) -> Set[str]:
+    return {target[:i] + target[i + 1:] for i in range(len(target))}
+
+
+def _token_deletions(sequence: Tuple[str, ...]) -> Set[Tuple[str, ...]]:
+    """Token sequences left by one deletion from any ordering of sequence: a character of a token, or the delimiter
+    between any two tokens."""
+    found = set()
+    for i, token in enumerate(sequence):
+        rest = sequence[:i] + sequence[i + 1:]
+        found |= {rest + (deleted,) for deleted in _deletions(token)}
+        found |= {rest[:j] + rest[j + 1:] + (token + other,) for j, other in enumerate(rest)}
+    return found
+
+
+def token_key(sequence: Iterable[str]) -> str:
+    return '_'.join(sorted(sequence))
+
+
+def form_keys(form: str, max_deletes: int = 2) -> Set[str]:
+    """token_key of every string left by up to max_deletes deletions from form."""
+    forms = level = {form}
+    for _ in range(max_deletes):
+        level = {deleted for target in level for deleted in _deletions(target)}
+        forms = forms | level
+    return {token_key(target.split('_')) for target in forms}
+
+
+def reordered_keys(form: str, max_deletes: int = 2) -> Set[str]:
+    """token_key of every string left by up to max_deletes deletions from any reordering of the tokens of form."""
+    sequences = level = {tuple(form.split('_'))}
+    for _ in range(max_deletes):
+        level = {deleted for sequence in level for deleted in _token_deletions(sequence)}
+        sequences = sequences | level
+    return {token_key(sequence) for sequence in sequences}
+
+
+class EditDistanceIndex:
+    """Trie over the one_step_form of the indexed names, and the token deletion keys of the forms."""
+
+    def __init__(self, names: Iterable[str] = (), max_dist: int = 2) -> None:
+        """max_dist bounds the distances one_step_candidates finds."""
+        self.root = {}
+        self.max_dist = max_dist
+        self.keys: Dict[str, Set[str]] = defaultdict(set)  # token deletion key -> names
+        self.num_names = 0
+        for name in names:
+            self.add(name)
+
+    def __len__(self) -> int:
+        return self.num_names
+
+    def add(self, name: str) -> None:
+        if not get_profile(name).shallow_sequence: return  # only delimiters, never classified
+        form = one_step_form(name)
+        node = self.root
+        for char in form:
+            node = node.setdefault(char, {})
+        names = node.setdefault(_NAMES, set())
+        if name not in names:
+            names.add(name)
+            self.num_names += 1
+            for key in form_keys(form, self.max_dist):
+                self.keys[key].add(name)
+
+    def within(self, query: str, max_dist: int = 2) -> Dict[str, int]:
+        """Indexed names whose form is within max_dist of query, mapped to that distance."""
+        found = {}
+        cap = max_dist + 1
+        first_row = [min(j, cap) for j in range(len(query) + 1)]
+        if first_row[-1] <= max_dist:
+            for name in self.root.get(_NAMES, ()): found[name] = first_row[-1]
+        stack = [(self.root, 1, None, first_row, 0, None)]
+        while stack:
+            node, depth, prev_prev_row, prev_row, prev_min, prev_char = stack.pop()
+            # only cells within max_dist of the diagonal can stay within max_dist, the others are capped
+            low, high = max(1, depth - max_dist), min(len(query), depth + max_dist)
+            for char, child in node.items():
+                if char is _NAMES: continue
+                row = [cap] * (len(query) + 1)
+                row[0] = row_min = min(depth, cap)
+                for j in range(low, high + 1):
+                    dist = prev_row[j - 1] + (char != query[j - 1])
+                    if prev_row[j] + 1 < dist: dist = prev_row[j] + 1
+                    if row[j - 1] + 1 < dist: dist = row[j - 1] + 1
+                    if prev_prev_row is not None and j > 1 and char == query[j - 2] and prev_char == query[j - 1] \
+                            and prev_prev_row[j - 2] + 1 < dist:
+                        dist = prev_prev_row[j - 2] + 1
+                    if dist > cap: dist = cap
+                    row[j] = dist
+                    if dist < row_min: row_min = dist
+                if row[-1] <= max_dist:
+                    for name in child.get(_NAMES, ()): found[name] = row[-1]
+                if row_min <= max_dist or prev_min <= max_dist:  # else distances never decrease below
+                    stack.append((child, depth + 1, prev_row, row, row_min, char))
+        return found
+
+    def one_step_candidates(self, adversarial_pkg: str) -> Set[str]:
+        """Indexed names whose form is within max_dist of some reordering of the tokens of adversarial_pkg, i.e. which
+        may be a 1-step D-L dist of it, to be confirmed by OneStepLDDist."""
+        if not get_profile(adversarial_pkg).shallow_sequence: return set()
+        found = set()
+        for key in reordered_keys(one_step_form(adversarial_pkg), self.max_dist):
+            found |= self.keys.get(key, set())
+        return found
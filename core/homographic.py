@@ -1,3 +1,9 @@
+from collections import defaultdict
+from typing import Set
+
+from core import utils
+
+
 ASCII_HOMOGRAPHS = {
     'a':"eoq4",
     'b':"dp",
@@ -50,25 +56,61 @@ UNICODE_HOMOGRAPHS = {
     '-': "ˉ‾▔﹉﹊﹋﹌￣",
 }
 
-# Limit to only one 
+# reverse map of UNICODE_HOMOGRAPHS for str.translate, glyphs listed under several characters keep the first one
+UNICODE_SKELETON = {}
+for character, glyphs in UNICODE_HOMOGRAPHS.items():
+    for glyph in glyphs:
+        UNICODE_SKELETON.setdefault(ord(glyph), character)
+
+
+def skeleton(target: str) -> str:
+    """target with every unicode homoglyph replaced by the character it imitates, in one pass."""
+    return target.translate(UNICODE_SKELETON)
+
+
+def is_homograph(character: str, replacement: str) -> bool:
+    return replacement in ASCII_HOMOGRAPHS.get(character, '') or UNICODE_SKELETON.get(ord(replacement)) == character
+
+
+# Limit to only one
 def generate_homographic_terminologies(base_pkg, adversarial_pkg):
-    is_homographic_replacement = False
-    for index, character in enumerate(base_pkg):
-        ascii_replacement_candidates = ''
-        unicode_replacement_candidates = ''
-        if character in ASCII_HOMOGRAPHS: 
-            ascii_replacement_candidates=ASCII_HOMOGRAPHS[character]
-
-        if character in unicode_replacement_candidates:
-            unicode_replacement_candidates = UNICODE_HOMOGRAPHS[character]
-        
-        all_candidates = ascii_replacement_candidates  + unicode_replacement_candidates
-
-        for candidate in all_candidates:
-            temp = list(base_pkg)
-            temp[index] = candidate
-            new_string = ''.join(temp)
-            if new_string == adversarial_pkg:
-                is_homographic_replacement  = True
-
-    return is_homographic_replacement
\ No newline at end of file
+    """Whether adversarial_pkg is base_pkg with exactly one character replaced by a homograph of it."""
+    if len(base_pkg) != len(adversarial_pkg): return False
+    replaced = [(b, a) for b, a in zip(base_pkg, adversarial_pkg) if b != a]
+    return len(replaced) == 1 and is_homograph(*replaced[0])
+
+
+def homograph_key(target: str) -> str:
+    """target without delimiters, HomographicReplacement compares the names in this form."""
+    return ''.join(c for c in target if c not in utils.DELIMITERS)
+
+
+def ascii_variants(target: str) -> Set[str]:
+    """Every string with one character of target replaced by one of its ascii homographs."""
+    return {target[:i] + candidate + target[i + 1:] for i, character in enumerate(target) for candidate in ASCII_HOMOGRAPHS.get(character, '')}
+
+
+class HomographIndex:
+    """Maps names to the indexed (popular) pkgs they imitate by one homographic replacement, names are keyed without
+    their delimiters as HomographicReplacement compares them."""
+
+    def __init__(self, base_pkgs = ()) -> None:
+        self.base_pkgs = defaultdict(set)  # homograph_key -> base pkgs
+        self.variants = defaultdict(set)  # ascii one-replacement variant of the key -> base pkgs
+        for base_pkg in base_pkgs:
+            self.add(base_pkg)
+
+    def add(self, base_pkg: str) -> None:
+        key = homograph_key(base_pkg)
+        self.base_pkgs[key].add(base_pkg)
+        for variant in ascii_variants(key):
+            self.variants[variant].add(base_pkg)
+
+    def imitated(self, adversarial_pkg: str) -> set:
+        """Base pkgs b for which HomographicReplacement()(b, adversarial_pkg) holds."""
+        key = homograph_key(adversarial_pkg)
+        found = set(self.variants.get(key, ()))
+        unicode_skeleton = skeleton(key)
+        if unicode_skeleton in self.base_pkgs and generate_homographic_terminologies(unicode_skeleton, key):
+            found |= self.base_pkgs[unicode_skeleton]
+        return found
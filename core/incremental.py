@@ -0,0 +1,133 @@
+"""
+Incremental scans of newly published names against a fixed set of popular packages.
+
+The candidate index of the popular packages (all their blocking keys, see core/candidates.py) is pickled behind a
+signature of everything it was derived from, and only rebuilt when the popular list, the corpora, the segmenter, the
+detector selection or the key derivation (candidates.INDEX_VERSION) changes. The new names come from an append-only
+feed (one name per line); a DeltaStore records the high-water mark, the byte offset of the feed already scanned, so
+every run only reads and classifies the lines added since the previous one and appends their results to the cumulative
+output. Like a CheckpointStore it also records the size of the output, so a run which crashed after writing results
+but before advancing the mark is rolled back instead of appended twice.
+"""
+
+import hashlib
+import logging
+import os
+import os.path as osp
+import pickle
+import sqlite3
+import tempfile
+from datetime import datetime
+from typing import Collection, Iterable, List, Optional, Tuple
+
+from core import tokens, segmentation, neighbors
+from core.candidates import CandidateIndex, INDEX_VERSION
+
+
+def index_signature(base_pkgs: Iterable[str], detectors: Optional[Collection[int]] = None) -> str:
+    """Changes whenever CandidateIndex(base_pkgs, detectors = detectors) would be built differently."""
+    digest = hashlib.sha1('\n'.join(sorted(base_pkgs)).encode())
+    probe = CandidateIndex(detectors = detectors)
+    digest.update(repr((INDEX_VERSION, probe.max_deletes, probe.token_keys, probe.shared_tokens, probe.edit_keys, probe.glyph_keys, probe.phonetic_keys, probe.semantic_keys)).encode())
+    if probe.token_keys or probe.semantic_keys:  # the token keys depend on segmentation and lemmas
+        digest.update(f':{tokens.source_signature()}:{segmentation.SEGMENTER}:{segmentation.signature()}'.encode())
+    if probe.semantic_keys:
+        digest.update(f':{neighbors.signature()}'.encode())
+    return digest.hexdigest()
+
+
+def save_index(index: CandidateIndex, signature: str, path: str) -> None:
+    """The signature is written on the first line, ahead of the pickled index. Replaced atomically, so concurrent runs
+    never read a partial index."""
+    fd, tmp_path = tempfile.mkstemp(dir = osp.dirname(osp.abspath(path)), prefix = '.index-')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(signature.encode() + b'\n')
+        pickle.dump(index, f, protocol = pickle.HIGHEST_PROTOCOL)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+
+
+def load_index(path: str, signature: str) -> Optional[CandidateIndex]:
+    """The index saved at path, or None if it is missing, was built from different inputs or cannot be unpickled."""
+    if not osp.isfile(path): return None
+    with open(path, 'rb') as f:
+        if f.readline().rstrip(b'\n') != signature.encode(): return None  # never unpickles a stale index
+        try:
+            return pickle.load(f)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+            logging.warning(f'Ignoring the unreadable candidate index "{path}": {e!r}')
+            return None
+
+
+def load_or_build_index(path: str, base_pkgs: Iterable[str], detectors: Optional[Collection[int]] = None) -> CandidateIndex:
+    base_pkgs = sorted(base_pkgs)
+    signature = index_signature(base_pkgs, detectors)
+    index = load_index(path, signature)
+    if index is None:
+        logging.info(f'Building the candidate index of {len(base_pkgs)} base pkgs into {path}')
+        index = CandidateIndex(base_pkgs, detectors = detectors)
+        save_index(index, signature, path)
+    return index
+
+
+class DeltaStore:
+    """High-water mark of an append-only feed of new package names, and a log of the runs which advanced it."""
+
+    def __init__(self, path: str, fingerprint: str) -> None:
+        """fingerprint identifies the base packages and options, a store written with others is refused."""
+        self.path = path
+        self.con = sqlite3.connect(path)
+        self.con.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        self.con.execute('CREATE TABLE IF NOT EXISTS runs (run INTEGER PRIMARY KEY, first_offset INTEGER, last_offset INTEGER, pairs INTEGER, hits INTEGER, finished_at TEXT)')
+        stored = self.con.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+        if stored and stored[0] != fingerprint:
+            self.con.close()
+            raise ValueError(f'"{path}" was written with different base pkgs or options, start a new delta store and outfile')
+        self.con.execute("INSERT OR REPLACE INTO meta VALUES ('fingerprint', ?)", (fingerprint,))
+        self.con.commit()
+
+    def __enter__(self) -> 'DeltaStore':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def high_water_mark(self) -> int:
+        """Byte offset of the feed up to which it was already scanned."""
+        return self.con.execute('SELECT COALESCE(MAX(last_offset), 0) FROM runs').fetchone()[0]
+
+    def read_new(self, feed_path: str) -> Tuple[List[str], int]:
+        """(names past the high-water mark, new high-water mark), only the new part of the feed is read."""
+        mark = self.high_water_mark()
+        if osp.getsize(feed_path) < mark:
+            raise ValueError(f'"{feed_path}" is shorter than the {mark} bytes already scanned, it must only be appended to')
+        with open(feed_path, 'rb') as f:
+            if mark:
+                f.seek(mark - 1)
+                if f.read(1) != b'\n':
+                    raise ValueError(f'"{feed_path}" does not end a line at the {mark} bytes already scanned, it must only be appended to')
+            new = f.read()
+        new = new[:new.rfind(b'\n') + 1]  # a partial last line is still being written, left to the next run
+        return [name.strip() for name in new.decode().splitlines() if name.strip()], mark + len(new)
+
+    def output_size(self) -> Optional[int]:
+        """Size of the output file when the last run started or advanced the mark, None if unknown."""
+        size = self.con.execute("SELECT value FROM meta WHERE key = 'output_size'").fetchone()
+        return None if size is None or size[0] is None else int(size[0])
+
+    def record_output_size(self, output_size: int) -> None:
+        """Size of the output file before a run writes any result."""
+        self.con.execute("INSERT OR REPLACE INTO meta VALUES ('output_size', ?)", (output_size,))
+        self.con.commit()
+
+    def advance(self, last_offset: int, num_pairs: int, num_hits: int, output_size: Optional[int] = None) -> None:
+        """Records a run, call once its results are on disk. output_size: size of the output file with them synced."""
+        first_offset = self.high_water_mark()
+        self.con.execute('INSERT INTO runs (first_offset, last_offset, pairs, hits, finished_at) VALUES (?, ?, ?, ?, ?)',
+                         (first_offset, last_offset, num_pairs, num_hits, datetime.now().isoformat()))
+        if output_size is not None:
+            self.con.execute("INSERT OR REPLACE INTO meta VALUES ('output_size', ?)", (output_size,))
+        self.con.commit()
+
+    def close(self) -> None:
+        self.con.close()
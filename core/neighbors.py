@@ -0,0 +1,89 @@
+"""
+Reverse semantic lookup: the corpus tokens closest to a given token.
+
+`tools/build_token_vectors.py` restricts the fastText model to the corpus tokens (package and english tokens), stores
+their normalized vectors as float16 and, if hnswlib is installed, builds an HNSW index over them. Without the index the
+neighbors are found by an exact scan, the float16 matrix is converted to float32 a chunk of rows at a time.
+"""
+
+import os.path as osp, os
+import json
+from typing import List, Tuple
+
+import numpy as np
+
+from core import semantic
+
+try: import hnswlib
+except ModuleNotFoundError: hnswlib = None
+
+PATH = osp.dirname(osp.realpath(__file__))
+VECTORS_PATH = osp.join(PATH, 'models', 'token-vectors.npy')
+KEYS_PATH = osp.join(PATH, 'models', 'token-vectors.json')
+HNSW_PATH = osp.join(PATH, 'models', 'token-vectors.hnsw')
+CHUNK_ROWS = 2**16  # rows of the exact scan converted to float32 at once
+
+
+def available() -> bool:
+    """Whether tools/build_token_vectors.py was run."""
+    return osp.isfile(VECTORS_PATH) and osp.isfile(KEYS_PATH)
+
+
+def signature() -> str:
+    """Changes whenever the restricted vectors are rebuilt."""
+    stat = os.stat(VECTORS_PATH)
+    return f'{stat.st_size}:{stat.st_mtime_ns}:{semantic.SIMILARITY_THRESHOLD}'
+
+
+class TokenNeighbors:
+    """Nearest corpus tokens by cosine similarity, over the restricted float16 vectors."""
+
+    def __init__(self, vectors_path: str = VECTORS_PATH, keys_path: str = KEYS_PATH, hnsw_path: str = HNSW_PATH) -> None:
+        self.vectors = np.load(vectors_path, mmap_mode = 'r')
+        with open(keys_path, 'r') as f:
+            self.keys = json.load(f)
+        self.key_to_index = {key: i for i, key in enumerate(self.keys)}
+        self.index = None
+        if hnswlib is not None and osp.isfile(hnsw_path):
+            self.index = hnswlib.Index(space = 'ip', dim = self.vectors.shape[1])
+            self.index.load_index(hnsw_path, max_elements = len(self.keys))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def vector(self, token: str) -> np.ndarray:
+        """Normalized vector of token, from the restricted vectors if it is a corpus token, else from the full model."""
+        if token in self.key_to_index:
+            return np.asarray(self.vectors[self.key_to_index[token]], dtype = np.float32)
+        return semantic.unit_vector(token)
+
+    def neighbors(self, token: str, k: int = 10, threshold: float = semantic.SIMILARITY_THRESHOLD) -> List[Tuple[str, float]]:
+        """Up to k (token, similarity) pairs with similarity >= threshold, most similar first, token itself excluded."""
+        query = self.vector(token)
+        if not query.any(): return []  # not in the model
+        if self.index is not None:
+            self.index.set_ef(max(50, 2 * k))
+            labels, distances = self.index.knn_query(query, k = min(k + 1, len(self.keys)))
+            found = [(int(i), 1 - float(d)) for i, d in zip(labels[0], distances[0])]
+        else:
+            similarities = np.concatenate([self.vectors[start:start + CHUNK_ROWS].astype(np.float32) @ query
+                                           for start in range(0, len(self.keys), CHUNK_ROWS)])
+            top = np.argpartition(-similarities, min(k + 1, len(self.keys)) - 1)[:k + 1]
+            found = [(int(i), float(similarities[i])) for i in top]
+        found.sort(key = lambda item: item[1], reverse = True)
+        return [(self.keys[i], s) for i, s in found if self.keys[i] != token and s >= threshold][:k]
+
+
+_token_neighbors = None
+
+
+def get_token_neighbors() -> TokenNeighbors:
+    global _token_neighbors
+    if _token_neighbors is None:
+        _token_neighbors = TokenNeighbors(VECTORS_PATH, KEYS_PATH, HNSW_PATH)
+    return _token_neighbors
+
+
+def semantic_neighbors(token: str, k: int = 10, threshold: float = semantic.SIMILARITY_THRESHOLD) -> List[Tuple[str, float]]:
+    """Corpus tokens semantically close to token, the reverse of semantic.is_semantically_similar."""
+    return get_token_neighbors().neighbors(token, k = k, threshold = threshold)
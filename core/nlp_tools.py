@@ -1,14 +1,26 @@
 """
-
+WordNet lemmatization. The lemmas of the corpus tokens are precomputed in the corpus snapshot (see core/tokens.py) and
+those of other names in the persistent cache (see core/disk_cache.py). NLTK and WordNet are only loaded for tokens found
+in neither, on the first such lemmatize call (or get_lemmatizer).
 """
 
 from functools import lru_cache
-from nltk.stem import WordNetLemmatizer
 
+from core import disk_cache, tokens
+
+
+LEMMATIZER = None
 
-LEMMATIZER = WordNetLemmatizer()
+def get_lemmatizer():
+    global LEMMATIZER
+    if LEMMATIZER is None:
+        from nltk.stem import WordNetLemmatizer
+        LEMMATIZER = WordNetLemmatizer()
+        LEMMATIZER.lemmatize('')  # loads wordnet
+    return LEMMATIZER
 
 @lru_cache(2**16)
 def lemmatize(target: str) -> str:
-    return LEMMATIZER.lemmatize(target)
-lemmatize('')  # loads lemmatizer
\ No newline at end of file
+    lemma = tokens.LEMMAS.get(target)
+    if lemma is None: lemma = disk_cache.cached_lemma(target)
+    return lemma if lemma is not None else get_lemmatizer().lemmatize(target)
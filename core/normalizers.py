@@ -1,94 +1,146 @@
 """
+Normalization stages applied to a (base, adversarial) pair before a detector compares them.
 
+Every stage maps a pair of names to a pair of normalized names. A detector declares the stages it needs, outermost
+first, with @normalize(...), e.g. @normalize('one_step_LD_dist', 'delimiters'). The stage paths of all detectors form a
+tree of shared prefixes: within classify_typosquat a pair is wrapped in a NormalizedPair, which computes the output of
+every path prefix once and hands it to all detectors depending on it.
 """
 
-from typing import Callable
+from typing import Callable, Dict, Tuple, Union
 from functools import reduce, wraps
 
 from core import nlp_tools
 from core.utils import *
+from core.profiles import PackageProfile, get_profile, get_name
+
+Pair = Tuple[str, str]
 
 
-def normalize_one_step_LD_dist(f: Callable) -> Callable:
-    @wraps(f)
-    def decorated(instance, base_pkg: str, adversarial_pkg: str, *normalized_detectors) -> str:
-        if normalized_detectors:
-            detector = normalized_detectors
-        else:
-            detector={} 
-
-        if len(base_pkg) < 4: return f(instance, base_pkg, adversarial_pkg)
-        sorted_base_seq = to_sorted_sequence(base_pkg)
-        preprocessed_base = '_'.join(sorted_base_seq)
-
-        adversarial_delims = [char for char in adversarial_pkg if char in DELIMITERS]
-        adversarial_seq = to_sequence(adversarial_pkg)
-        sorted_adversarial_seq = to_sorted_sequence(adversarial_pkg)
-        adversarial_sort_map = {token: adversarial_seq.index(token) for token in sorted_adversarial_seq}
-        preprocessed_adversarial = '_'.join(sorted_adversarial_seq)
-
-        if len(sorted_adversarial_seq) > len(adversarial_delims) + 1:
-            diff = len(sorted_adversarial_seq) - len(adversarial_delims)
-            adversarial_delims += [' ' for _ in range(diff)]  
-    
-        adversarial_processed = adversarial_pkg
-        if DL_dist(preprocessed_base, preprocessed_adversarial) == 1:
-            for base_token, adversarial_token in zip(sorted_base_seq, sorted_adversarial_seq):
-                if base_token != adversarial_token:
-                    if abs(len(adversarial_seq[adversarial_sort_map[adversarial_token]]) - len(base_token)) <= 1:
-                        adversarial_seq[adversarial_sort_map[adversarial_token]] = base_token
-                        adversarial_processed = reduce(lambda base, other: base + other[0] + other[1], zip(adversarial_delims, adversarial_seq[1:]), adversarial_seq[0])
-                        detector['1-step-dl'] = True
-                    break   
-
-        return f(instance, base_pkg, adversarial_processed, detector)
-    return decorated
-
-
-def normalize_scope(f: Callable) -> Callable:
-    @wraps(f)
-    def decorated(instance, base_pkg: str, adversarial_pkg: str, *normalized_detectors) -> str:
-        split_base_pkg = base_pkg.split('/')
-        if len(split_base_pkg) > 1:
-            base_pkg_normalized = ''.join(split_base_pkg[1:])
-        else:
-            base_pkg_normalized = base_pkg
-
-        split_adversarial_pkg = adversarial_pkg.split('/')
-        if len(split_adversarial_pkg) > 1:
-            adversarial_pkg_normalized = ''.join(split_adversarial_pkg[1:])
-        else:
-            adversarial_pkg_normalized = adversarial_pkg
-        return f(instance, base_pkg_normalized, adversarial_pkg_normalized)
-    return decorated
-
-
-def normalize_delimiters(f: Callable) -> Callable:
-    @wraps(f)
-    def decorated(instance, base_pkg: str, adversarial_pkg: str, *normalized_detectors) -> str:
-        base_replaced = replace_delimiters(base_pkg, '_')
-        adversarial_replaced = replace_delimiters(adversarial_pkg, '_')
-        return f(instance, base_replaced, adversarial_replaced)
-    return decorated
-
-
-def normalize_sequence_order(f: Callable = None, *, deep: bool = True ) -> Callable:
-    def decorator(g):
-        @wraps(g)
-        def wrapper(instance, base_pkg: str, adversarial_pkg: str, *normalized_detectors) -> str:
-            return g(instance, sorted_tokens(base_pkg, deep = deep), sorted_tokens(adversarial_pkg, deep = deep))
-        return wrapper
-    return decorator(f) if f else decorator
+def normalized_one_step_LD_dist(base_pkg: str, adversarial_pkg: str) -> Pair:
+    """Replaces the adversarial token 1 D-L step away from a base token with the base token."""
+    base_profile, adversarial_profile = get_profile(base_pkg), get_profile(adversarial_pkg)
+    base_pkg, adversarial_pkg = base_profile.name, adversarial_profile.name
+    if len(base_pkg) < 4: return base_pkg, adversarial_pkg
+    sorted_base_seq = base_profile.sorted_sequence
+    preprocessed_base = '_'.join(sorted_base_seq)
+
+    adversarial_delims = list(adversarial_profile.delimiters)
+    adversarial_seq = list(adversarial_profile.sequence)
+    sorted_adversarial_seq = adversarial_profile.sorted_sequence
+    adversarial_sort_map = {token: adversarial_seq.index(token) for token in sorted_adversarial_seq}
+    preprocessed_adversarial = '_'.join(sorted_adversarial_seq)
+
+    if len(sorted_adversarial_seq) > len(adversarial_delims) + 1:
+        diff = len(sorted_adversarial_seq) - len(adversarial_delims)
+        adversarial_delims += [' ' for _ in range(diff)]
+
+    adversarial_processed = adversarial_pkg
+    if DL_dist(preprocessed_base, preprocessed_adversarial) == 1:
+        for base_token, adversarial_token in zip(sorted_base_seq, sorted_adversarial_seq):
+            if base_token != adversarial_token:
+                if abs(len(adversarial_seq[adversarial_sort_map[adversarial_token]]) - len(base_token)) <= 1:
+                    adversarial_seq[adversarial_sort_map[adversarial_token]] = base_token
+                    adversarial_processed = reduce(lambda base, other: base + other[0] + other[1], zip(adversarial_delims, adversarial_seq[1:]), adversarial_seq[0])
+                break
+
+    return base_pkg, adversarial_processed
+
+
+def normalized_scope(base_pkg: str, adversarial_pkg: str) -> Pair:
+    """Drops the npm scope."""
+    base_pkg, adversarial_pkg = get_name(base_pkg), get_name(adversarial_pkg)
+    split_base_pkg = base_pkg.split('/')
+    if len(split_base_pkg) > 1:
+        base_pkg_normalized = ''.join(split_base_pkg[1:])
+    else:
+        base_pkg_normalized = base_pkg
+
+    split_adversarial_pkg = adversarial_pkg.split('/')
+    if len(split_adversarial_pkg) > 1:
+        adversarial_pkg_normalized = ''.join(split_adversarial_pkg[1:])
+    else:
+        adversarial_pkg_normalized = adversarial_pkg
+    return base_pkg_normalized, adversarial_pkg_normalized
+
+
+def normalized_delimiters(base_pkg: str, adversarial_pkg: str) -> Pair:
+    """Replaces every delimiter by '_'."""
+    return get_profile(base_pkg).delimited, get_profile(adversarial_pkg).delimited
+
+
+def normalized_sequence_order(base_pkg: str, adversarial_pkg: str) -> Pair:
+    """Sorts the segmented tokens."""
+    return get_profile(base_pkg).sorted_tokens, get_profile(adversarial_pkg).sorted_tokens
+
+
+def normalized_shallow_sequence_order(base_pkg: str, adversarial_pkg: str) -> Pair:
+    """Sorts the tokens split across delimiters, without segmenting them."""
+    return get_profile(base_pkg).shallow_sorted_tokens, get_profile(adversarial_pkg).shallow_sorted_tokens
 
 
-def normalize_grammar(f: Callable) -> Callable:
-    @wraps(f)
-    def decorated(instance, base_pkg: str, adversarial_pkg: str, *normalized_detectors) -> str:
-        base_delims = [char for char in adversarial_pkg if char in DELIMITERS]
-        adversarial_delims = [char for char in adversarial_pkg if char in DELIMITERS]
-        grammar_checked_base = [nlp_tools.lemmatize(token) for token in to_sequence(base_pkg)]
-        grammar_checked_adversarial = [nlp_tools.lemmatize(token) for token in to_sequence(adversarial_pkg)]
-        base_processed = reduce(lambda base, other: base + other[0] + other[1], zip(base_delims, grammar_checked_base[1:]), grammar_checked_base[0])
-        adversarial_processed = reduce(lambda base, other: base + other[0] + other[1], zip(adversarial_delims, grammar_checked_adversarial[1:]), grammar_checked_adversarial[0])
-        return f(instance, base_processed, adversarial_processed)
-    return decorated
\ No newline at end of file
+def normalized_grammar(base_pkg: str, adversarial_pkg: str) -> Pair:
+    """Lemmatizes every token."""
+    base_pkg, adversarial_pkg = get_name(base_pkg), get_name(adversarial_pkg)
+    base_delims = [char for char in adversarial_pkg if char in DELIMITERS]
+    adversarial_delims = [char for char in adversarial_pkg if char in DELIMITERS]
+    grammar_checked_base = [nlp_tools.lemmatize(token) for token in to_sequence(base_pkg)]
+    grammar_checked_adversarial = [nlp_tools.lemmatize(token) for token in to_sequence(adversarial_pkg)]
+    base_processed = reduce(lambda base, other: base + other[0] + other[1], zip(base_delims, grammar_checked_base[1:]), grammar_checked_base[0])
+    adversarial_processed = reduce(lambda base, other: base + other[0] + other[1], zip(adversarial_delims, grammar_checked_adversarial[1:]), grammar_checked_adversarial[0])
+    return base_processed, adversarial_processed
+
+
+STAGES: Dict[str, Callable[[str, str], Pair]] = {
+    'one_step_LD_dist': normalized_one_step_LD_dist,
+    'scope': normalized_scope,
+    'delimiters': normalized_delimiters,
+    'sequence_order': normalized_sequence_order,
+    'shallow_sequence_order': normalized_shallow_sequence_order,
+    'grammar': normalized_grammar,
+}
+
+
+class NormalizedPair:
+    """A (base, adversarial) pair and the memoized outputs of the stage paths applied to it."""
+
+    def __init__(self, base_pkg: Union[str, PackageProfile], adversarial_pkg: Union[str, PackageProfile]) -> None:
+        self.base_pkg, self.adversarial_pkg = base_pkg, adversarial_pkg
+        self._outputs: Dict[Tuple[str, ...], Pair] = {}
+
+    def stage(self, path: Tuple[str, ...]) -> Pair:
+        """Output of the stages of path applied in order, each prefix of path is computed once per pair."""
+        if not path: return self.base_pkg, self.adversarial_pkg
+        if path not in self._outputs:
+            self._outputs[path] = STAGES[path[-1]](*self.stage(path[:-1]))
+        return self._outputs[path]
+
+
+def normalize(*stages: str) -> Callable:
+    """Declares the stages a detector's __call__ takes its arguments from, outermost first.
+
+    Called directly the detector normalizes its pair on its own; DetectorBase.detect uses the outputs shared through a
+    NormalizedPair instead.
+    """
+    unknown = set(stages) - set(STAGES)
+    if unknown: raise ValueError(f'unknown normalization stages {sorted(unknown)}')
+
+    def decorator(f: Callable) -> Callable:
+        @wraps(f)
+        def decorated(instance, base_pkg: str, adversarial_pkg: str, *normalized_detectors) -> int:
+            return f(instance, *NormalizedPair(base_pkg, adversarial_pkg).stage(stages))
+        decorated.stages = stages
+        return decorated
+    return decorator
+
+
+# single stage decorators
+normalize_one_step_LD_dist = normalize('one_step_LD_dist')
+normalize_scope = normalize('scope')
+normalize_delimiters = normalize('delimiters')
+normalize_grammar = normalize('grammar')
+
+
+def normalize_sequence_order(f: Callable = None, *, deep: bool = True) -> Callable:
+    decorator = normalize('sequence_order' if deep else 'shallow_sequence_order')
+    return decorator(f) if f else decorator
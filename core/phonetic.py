@@ -0,0 +1,75 @@
+"""
+Phonetic keys used by HomophonicSimilarity, and an index from them to packages.
+
+The keys of every corpus token are computed once, when the corpus snapshot is built (see core/tokens.py), other tokens
+are keyed on first use.
+"""
+
+from collections import defaultdict
+from functools import lru_cache
+from typing import Iterable, Set, Tuple
+
+from jellyfish import soundex, metaphone
+
+from core import tokens
+from core.profiles import get_profile
+
+
+@lru_cache(2**16)
+def _phonetic_key(token: str) -> Tuple[str, str]:
+    return soundex(token), metaphone(token)
+
+
+def phonetic_key(token: str) -> Tuple[str, str]:
+    """(soundex, metaphone) of token, tokens sounding alike share it."""
+    key = tokens.PHONETIC_KEYS.get(token)
+    return key if key is not None else _phonetic_key(token)
+
+
+def _transpositions(token: str) -> Set[str]:
+    """token and every string with one pair of adjacent characters swapped, HomophonicSimilarity undoes such swaps."""
+    return {token} | {token[:i] + token[i + 1] + token[i] + token[i + 2:] for i in range(len(token) - 1)}
+
+
+def indexed_keys(base_pkg: str) -> Set[tuple]:
+    """(tokens before, tokens after, phonetic key) of every corpus token of base_pkg, split as HomophonicSimilarity
+    splits it."""
+    sequence = get_profile(base_pkg).delimited.split('_')
+    # HomophonicSimilarity only accepts corpus tokens on the base side
+    return {(tuple(sequence[:i]), tuple(sequence[i + 1:]), phonetic_key(token))
+            for i, token in enumerate(sequence) if token in tokens.corpora['all']}
+
+
+def lookup_keys(adversarial_pkg: str) -> Set[tuple]:
+    """Keys under which the base packages adversarial_pkg may be a homophone of are indexed."""
+    sequence = get_profile(adversarial_pkg).delimited.split('_')
+    return {(tuple(sequence[:i]), tuple(sequence[i + 1:]), phonetic_key(variant))
+            for i, token in enumerate(sequence) for variant in _transpositions(token)}
+
+
+class PhoneticIndex:
+    """Inverted index from (other tokens, phonetic key of one token) to base packages.
+
+    Every corpus token of a base package is keyed with the tokens around it, so the packages an adversarial package
+    may be a homophone of are found with a lookup per token instead of a comparison per base package. The candidates
+    still have to be confirmed by HomophonicSimilarity.
+    """
+
+    def __init__(self, base_pkgs: Iterable[str] = ()) -> None:
+        self.index = defaultdict(set)
+        for base_pkg in base_pkgs:
+            self.add(base_pkg)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def add(self, base_pkg: str) -> None:
+        for key in indexed_keys(base_pkg):
+            self.index[key].add(base_pkg)
+
+    def candidates(self, adversarial_pkg: str) -> Set[str]:
+        found = set()
+        for key in lookup_keys(adversarial_pkg):
+            found |= self.index.get(key, set())
+        found.discard(adversarial_pkg)
+        return found
@@ -0,0 +1,91 @@
+"""
+Per-package profiles holding the derived forms of a name which the normalizers and detectors use.
+
+A profile is created once per unique name and every form is computed on first use, so with N base and M adversarial
+names the per-name work (delimiter replacement, segmentation, sorting, lemmatization) is done N + M times instead of
+once per pair and detector.
+"""
+
+from functools import cached_property, lru_cache, reduce
+from typing import Sequence, Tuple, Union
+
+from core import utils, nlp_tools
+
+
+class PackageProfile:
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __repr__(self) -> str:
+        return f'PackageProfile({self.name!r})'
+
+    def __str__(self) -> str:
+        return self.name
+
+    @cached_property
+    def delimited(self) -> str:
+        """All delimiters replaced by '_'."""
+        return utils.replace_delimiters(self.name, '_')
+
+    @cached_property
+    def delimiters(self) -> Tuple[str, ...]:
+        return tuple(char for char in self.name if char in utils.DELIMITERS)
+
+    @cached_property
+    def sequence(self) -> Tuple[str, ...]:
+        """Tokens split across delimiters and segmented."""
+        return tuple(utils.to_sequence(self.name))
+
+    @cached_property
+    def shallow_sequence(self) -> Tuple[str, ...]:
+        """Tokens split across delimiters only."""
+        return tuple(utils.to_sequence(self.name, deep = False))
+
+    @cached_property
+    def sorted_sequence(self) -> Tuple[str, ...]:
+        return tuple(sorted(self.sequence))
+
+    @cached_property
+    def sorted_tokens(self) -> str:
+        """Same as utils.sorted_tokens(name)."""
+        return self._join(sorted(self.sequence))
+
+    @cached_property
+    def shallow_sorted_tokens(self) -> str:
+        """Same as utils.sorted_tokens(name, deep = False)."""
+        return self._join(sorted(self.shallow_sequence))
+
+    @cached_property
+    def joined(self) -> str:
+        """Tokens concatenated without delimiters, equal for names differing only in delimiters."""
+        return ''.join(self.sequence)
+
+    @cached_property
+    def char_key(self) -> str:
+        """Sorted characters of the tokens, equal for names whose tokens are a reordering of each other."""
+        return ''.join(sorted(self.joined))
+
+    @cached_property
+    def lemmas(self) -> Tuple[str, ...]:
+        return tuple(nlp_tools.lemmatize(token) for token in self.sequence)
+
+    def _join(self, sequence: Sequence[str]) -> str:
+        """Joins sequence with the delimiters of name, padding with ' ' where segmentation added tokens."""
+        delims = list(self.delimiters)
+        if len(sequence) > len(delims) + 1:
+            delims += [' ' for _ in range(len(sequence) - len(delims))]
+        return reduce(lambda base, other: base + other[0] + other[1], zip(delims, sequence[1:]), sequence[0])
+
+
+@lru_cache(2**20)
+def _cached_profile(name: str) -> PackageProfile:
+    return PackageProfile(name)
+
+
+def get_profile(target: Union[str, PackageProfile]) -> PackageProfile:
+    """Profile of target, shared by every caller for the rest of the run."""
+    return target if isinstance(target, PackageProfile) else _cached_profile(target)
+
+
+def get_name(target: Union[str, PackageProfile]) -> str:
+    return target.name if isinstance(target, PackageProfile) else target
@@ -0,0 +1,162 @@
+"""
+Runs classify_typosquat over the base x adversarial space, optionally across a pool of forked workers.
+
+The space is partitioned into deterministic work units: the adversarial names are sorted and split into blocks of
+unit_size names, each unit pairing its block with every (candidate) base package.
+
+For cluster runs the space is first split into shards by a stable hash of the package names (see shard), so shard i/N
+is the same slice whatever order the package lists were read in.
+"""
+
+import gc
+import hashlib
+import zlib
+import multiprocessing as mp
+from collections import deque
+from datetime import datetime, timedelta
+from itertools import islice, product
+from typing import Collection, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from core.detectors import classify_typosquat, required_resources, load_resources
+from core.candidates import CandidateIndex
+
+
+class ScanResult(NamedTuple):
+    base_pkg: str
+    adv_pkg: str
+    classifications: Dict[Tuple[int, str], int]  # (detector key, detector name) -> count
+    elapsed: timedelta
+    error: Optional[str] = None
+
+
+class UnitResult(NamedTuple):
+    unit_id: int
+    num_pairs: int
+    results: List[ScanResult]  # positive or failed pairs only
+
+
+def classify_pair(pair: Tuple[str, str], **classify_kwargs) -> ScanResult:
+    """classify_kwargs are passed on to classify_typosquat."""
+    base_pkg, adv_pkg = pair
+    start_time = datetime.now()
+    try:
+        classifications = classify_typosquat(base_pkg, adv_pkg, **classify_kwargs)
+    except Exception as e:
+        return ScanResult(base_pkg, adv_pkg, {}, datetime.now() - start_time, f'{e}')
+    return ScanResult(base_pkg, adv_pkg, classifications, datetime.now() - start_time)
+
+
+def classify_chunk(chunk: List[Tuple[str, str]], classify_kwargs: Optional[dict] = None) -> List[ScanResult]:
+    """Classifies every pair of chunk, returns the positive or failed ones."""
+    results = (classify_pair(pair, **(classify_kwargs or {})) for pair in chunk)
+    return [r for r in results if r.classifications or r.error is not None]
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """Parses "i/N" into (i, N) with 0 <= i < N."""
+    try:
+        index, num_shards = (int(x) for x in spec.split('/'))
+    except ValueError:
+        raise ValueError(f'"{spec}" is not a valid shard, expected i/N')
+    if not 0 <= index < num_shards:
+        raise ValueError(f'"{spec}" is not a valid shard, expected 0 <= i < N')
+    return index, num_shards
+
+
+def in_shard(name: str, index: int, num_shards: int) -> bool:
+    return zlib.crc32(name.encode()) % num_shards == index
+
+
+def shard(base_pkgs: Set[str], adv_pkgs: Set[str], index: int, num_shards: int) -> Tuple[Set[str], Set[str]]:
+    """Slice index/num_shards of base_pkgs x adv_pkgs.
+
+    The larger of the two lists is split by name hash and paired with all of the other one, so that each shard gets an
+    even share of names and the candidate index is only queried for the names of the shard.
+    """
+    if len(adv_pkgs) >= len(base_pkgs):
+        return base_pkgs, {a for a in adv_pkgs if in_shard(a, index, num_shards)}
+    return {b for b in base_pkgs if in_shard(b, index, num_shards)}, adv_pkgs
+
+
+def fingerprint(base_pkgs: Iterable[str], adv_pkgs: Iterable[str], *options) -> str:
+    """Identifies a scan, units are only comparable between scans with the same fingerprint."""
+    digest = hashlib.sha1()
+    for names in (base_pkgs, adv_pkgs):
+        digest.update('\n'.join(sorted(names)).encode())
+        digest.update(b'\0')
+    digest.update(repr(options).encode())
+    return digest.hexdigest()
+
+
+def work_units(base_pkgs: Iterable[str], adv_pkgs: Iterable[str], unit_size: int = 1000, exhaustive: bool = False,
+        skip: Set[int] = frozenset(), detectors: Optional[Collection[int]] = None,
+        index: Optional[CandidateIndex] = None) -> Iterator[Tuple[int, Iterator[Tuple[str, str]]]]:
+    """Yields (unit id, pairs of the unit), skipping the unit ids in skip. index is a prebuilt candidate index of
+    base_pkgs, e.g. a persisted one (see core/incremental.py)."""
+    base_pkgs = sorted(base_pkgs)
+    if exhaustive: index = None
+    elif index is None: index = CandidateIndex(base_pkgs, detectors = detectors)
+
+    def unit_pairs(unit_advs: List[str]) -> Iterator[Tuple[str, str]]:
+        if index is None: return ((b, a) for a, b in product(unit_advs, base_pkgs))
+        return ((b, a) for a in unit_advs for b in sorted(index.candidates(a)))
+
+    for unit_id, unit_advs in enumerate(chunked(sorted(adv_pkgs), unit_size)):
+        if unit_id in skip: continue
+        yield unit_id, unit_pairs(unit_advs)
+
+
+def _unit_chunks(units: Iterable[Tuple[int, Iterable]], chunk_size: int) -> Iterator[Tuple[int, Optional[list]]]:
+    """Chunks never cross units, every unit is terminated by a (unit id, None) marker."""
+    for unit_id, pairs in units:
+        for chunk in chunked(pairs, chunk_size):
+            yield unit_id, chunk
+        yield unit_id, None
+
+
+def _classify_chunks(chunks: Iterable[Tuple[int, Optional[list]]], workers: int,
+        classify_kwargs: dict) -> Iterator[Tuple[int, int, Optional[List[ScanResult]]]]:
+    """Yields (unit id, chunk size, results) in input order, markers are passed through with results = None."""
+    if workers <= 1:
+        for unit_id, chunk in chunks:
+            yield (unit_id, 0, None) if chunk is None else (unit_id, len(chunk), classify_chunk(chunk, classify_kwargs))
+        return
+
+    load_resources(required_resources(classify_kwargs.get('detectors')))  # before forking, so the workers share them
+    gc.freeze()  # keeps the collector from touching (and so copying) the parent's objects in the children
+    with mp.get_context('fork').Pool(workers) as pool:
+        in_flight = deque()
+        for unit_id, chunk in chunks:
+            if chunk is None: in_flight.append((unit_id, 0, None))
+            else: in_flight.append((unit_id, len(chunk), pool.apply_async(classify_chunk, (chunk, classify_kwargs))))
+            if len(in_flight) >= 4 * workers:
+                unit_id, size, pending = in_flight.popleft()
+                yield unit_id, size, pending and pending.get()
+        while in_flight:
+            unit_id, size, pending = in_flight.popleft()
+            yield unit_id, size, pending and pending.get()
+
+
+def scan(units: Iterable[Tuple[int, Iterable[Tuple[str, str]]]], workers: int = 1, chunk_size: int = 1000,
+        **classify_kwargs) -> Iterator[UnitResult]:
+    """Classifies every pair of every unit, yielding one UnitResult per finished unit in input order. classify_kwargs
+    (detectors, early_exit, skip_expensive) are passed on to classify_typosquat.
+
+    With workers > 1 the resources of the selected detectors are loaded before forking, so the children share the
+    corpora and lemmatizer copy-on-write and the memory-mapped word vectors through the page cache. At most 4 chunks per
+    worker are in flight at any time.
+    """
+    num_pairs, results = 0, []
+    for unit_id, size, chunk_results in _classify_chunks(_unit_chunks(units, chunk_size), workers, classify_kwargs):
+        if chunk_results is None:
+            yield UnitResult(unit_id, num_pairs, results)
+            num_pairs, results = 0, []
+        else:
+            num_pairs += size
+            results += chunk_results
@@ -0,0 +1,105 @@
+"""
+Index of npm scopes for scope confusion lookups.
+
+ScopeConfusion flags a scoped pair when the names are equal past their scopes and the scopes are confusable (or only the
+base is scoped), or when the names are equal once scope markers and delimiters are dropped. ScopeIndex maps every
+unscoped base name to the scopes it is published under, and relates each adversarial scope to the confusable base
+scopes once, so the base packages a name imitates by scope confusion are found with a few lookups instead of a
+classification per pair. Registered with detectors.set_scope_index, ScopeConfusion reads the scope relations of a scan
+off the index as well.
+"""
+
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from core import utils
+from core.candidates import CandidateIndex, MAX_NAME_LEN
+from core.detectors import are_confusable
+
+
+def split_scope(target: str) -> Tuple[Optional[str], str]:
+    """(scope without '@', unscoped name), the scope is None for unscoped names."""
+    if target.startswith('@') and '/' in target:
+        scope, name = target[1:].split('/', 1)
+        return scope, name
+    return None, target
+
+
+def delimited(target: str) -> str:
+    return utils.replace_delimiters(target, '_')
+
+
+def stripped(target: str) -> str:
+    """target without scope markers and delimiters, equal for e.g. @babel/core and babel-core."""
+    return ''.join(c for c in target if c not in utils.DELIMITERS and c not in ('@', '/'))
+
+
+class ScopeIndex:
+    """Scoped base packages by unscoped name, and the base scopes every adversarial scope is confusable with.
+
+    Names are compared as ScopeConfusion compares them after the delimiter normalization. Matches which only appear
+    after the 1-step D-L normalization are missed, classify_typosquat finds those.
+    """
+
+    def __init__(self, base_pkgs: Iterable[str] = ()) -> None:
+        self.scopes: Dict[str, Set[str]] = defaultdict(set)  # delimited unscoped name -> delimited scopes
+        self.base_pkgs: Dict[Tuple[str, str], Set[str]] = defaultdict(set)  # (scope, name) -> base packages
+        self.stripped: Dict[str, Set[str]] = defaultdict(set)  # stripped name -> base packages
+        self.base_scopes: Set[str] = set()
+        self.scope_index = CandidateIndex()  # over base_scopes
+        self.related: Dict[str, Set[str]] = {}  # adversarial scope -> confusable base scopes
+        for base_pkg in base_pkgs:
+            self.add(base_pkg)
+
+    def add(self, base_pkg: str) -> None:
+        if not base_pkg or len(base_pkg) > MAX_NAME_LEN: return
+        self.stripped[stripped(base_pkg)].add(base_pkg)
+        scope, name = split_scope(base_pkg)
+        if scope is None: return
+        scope, name = delimited(scope), delimited(name)
+        if scope not in self.base_scopes:
+            self.base_scopes.add(scope)
+            self.scope_index.add(scope)
+            # relate the new scope to the adversarial scopes already looked up, as related_scopes would
+            probe = CandidateIndex([scope])
+            for adversarial_scope, related in self.related.items():
+                if scope in probe.candidates(adversarial_scope) and are_confusable(scope, adversarial_scope):
+                    related.add(scope)
+        self.scopes[name].add(scope)
+        self.base_pkgs[(scope, name)].add(base_pkg)
+
+    def candidate_scopes(self, adversarial_scope: str) -> Set[str]:
+        """Base scopes sharing a blocking key with adversarial_scope, none of them classified."""
+        return {scope for scope in self.scope_index.candidates(adversarial_scope) if scope}
+
+    def related_scopes(self, adversarial_scope: str) -> Set[str]:
+        """Base scopes adversarial_scope is confusable with, computed once per scope."""
+        if adversarial_scope not in self.related:
+            self.related[adversarial_scope] = {scope for scope in self.candidate_scopes(adversarial_scope)
+                                               if are_confusable(scope, adversarial_scope)}
+        return self.related[adversarial_scope]
+
+    def precompute(self, adversarial_pkgs: Iterable[str]) -> None:
+        """Relates the scopes of adversarial_pkgs to the base scopes ahead of the lookups, e.g. before forking."""
+        for adversarial_pkg in adversarial_pkgs:
+            scope, _ = split_scope(adversarial_pkg)
+            if scope: self.related_scopes(delimited(scope))
+
+    def imitated(self, adversarial_pkg: str, confirmed: bool = True) -> Set[str]:
+        """Base packages adversarial_pkg imitates by scope confusion. Unless confirmed, the scopes are not classified and
+        every base package under a candidate scope is returned, for classify_typosquat to confirm."""
+        if not adversarial_pkg or len(adversarial_pkg) > MAX_NAME_LEN: return set()
+        scope, name = split_scope(adversarial_pkg)
+        name = delimited(name)
+        found = set()
+        if scope is None:  # the scope was dropped
+            for base_scope in self.scopes.get(name, ()):
+                found |= self.base_pkgs[(base_scope, name)]
+        elif scope:
+            scopes = self.related_scopes(delimited(scope)) if confirmed else self.candidate_scopes(delimited(scope))
+            for base_scope in scopes & self.scopes.get(name, set()):
+                found |= self.base_pkgs[(base_scope, name)]
+        # scope markers moved into or out of the name
+        is_scoped = '/' in adversarial_pkg
+        found |= {b for b in self.stripped.get(stripped(adversarial_pkg), ()) if is_scoped or '/' in b}
+        return found
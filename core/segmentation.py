@@ -1,15 +1,105 @@
 """
+Splits delimiter-less names into tokens, e.g. 'coinstring' -> ['coin', 'string'].
 
+Two segmenters are available: 'greedy' (default) votes between four greedy passes, 'dp' finds the best split in a
+single pass (see segment_dp). Select one with set_segmenter or the TYPOMIND_SEGMENTER environment variable, before any
+name is segmented. Segmentations prepared offline are read from the persistent cache (see core/disk_cache.py).
 """
 
-from typing import Callable, List, Set
+import os
+import sys
+from typing import Callable, Dict, List, Set
 from icecream import ic
 from functools import lru_cache
 
-from core import nlp_tools, tokens
+from core import nlp_tools, tokens, disk_cache
+
+SEGMENTERS = ('greedy', 'dp')
+SEGMENTER = os.environ.get('TYPOMIND_SEGMENTER', 'greedy')
+SEGMENTER_VERSION = 1  # bump whenever a segmenter splits names differently
+# token costs of segment_dp: every token costs 1 plus SHORT_TOKEN_COST / length, minus POPULARITY_BONUS * rank
+SHORT_TOKEN_COST = 1.0
+POPULARITY_BONUS = 0.5
+
+
+def signature() -> str:
+    """Changes whenever the segmenters would split names differently for the same corpora."""
+    return f'{SEGMENTER_VERSION}:{SHORT_TOKEN_COST}:{POPULARITY_BONUS}'
+
+
+def set_segmenter(name: str) -> None:
+    global SEGMENTER
+    if name not in SEGMENTERS:
+        raise ValueError(f'unknown segmenter "{name}", expected one of {SEGMENTERS}')
+    SEGMENTER = name
+    segment.cache_clear()
+    from core import profiles  # imports this module
+    profiles._cached_profile.cache_clear()
+    detectors = sys.modules.get('core.detectors')
+    if detectors:
+        detectors.are_confusable.cache_clear()
+        if detectors._scope_index is not None: detectors._scope_index.related.clear()
+
 
 @lru_cache(2**16)
 def segment(target: str) -> List['str']:
+    cached = disk_cache.cached_segmentation(target, SEGMENTER)
+    if cached is not None: return cached
+    return segment_dp(target) if SEGMENTER == 'dp' else _segment_greedy(target)
+
+
+def dp_targets() -> Set[str]:
+    """Tokens segment_dp may split into: the corpus tokens, and the words whose lemma is an english token since the
+    greedy passes accept frames by their lemma."""
+    # same lengths as the greedy passes: package tokens from 2 characters, english tokens from 3
+    targets = {t for t in tokens.ALL_TOKENS if len(t) > 2 or (len(t) == 2 and t in tokens.PKG_TOKENS)}
+    targets |= {t for t, lemma in tokens.LEMMAS.items() if len(t) > 2 and lemma in tokens.EN_TOKENS}
+    return targets
+
+
+@lru_cache(1)
+def _token_trie() -> Dict:
+    """Character trie over dp_targets, each ending in a None key mapping to the token's cost."""
+    trie = {}
+    for token in dp_targets():
+        node = trie
+        for char in token:
+            node = node.setdefault(char, {})
+        node[None] = 1 + SHORT_TOKEN_COST / len(token) - POPULARITY_BONUS * tokens.PKG_TOKEN_TO_RANK.get(token, 0)
+    return trie
+
+
+def segment_dp(target: str) -> List[str]:
+    """Cheapest split of target into corpus tokens, [target] if there is none.
+
+    Viterbi over the end positions of target: the tokens starting at each position are read off the token trie, so
+    every split is scored in a single pass without lemmatizing candidate frames. Like the greedy segmenter it only
+    returns splits into corpus tokens or their inflections (see dp_targets), and keeps known or short names whole.
+    """
+    if len(target) <= 2 or target in tokens.ALL_TOKENS: return [target]
+    trie = _token_trie()
+    best = [None] * (len(target) + 1)  # (cost, start of the last token) of the cheapest split of target[:i]
+    best[0] = (0.0, None)
+    for start in range(len(target)):
+        if best[start] is None: continue
+        node = trie
+        for end in range(start, len(target)):
+            node = node.get(target[end])
+            if node is None: break
+            if None in node:
+                cost = best[start][0] + node[None]
+                if best[end + 1] is None or cost < best[end + 1][0]:
+                    best[end + 1] = (cost, start)
+    if best[-1] is None: return [target]
+    segments, end = [], len(target)
+    while end:
+        start = best[end][1]
+        segments.append(target[start:end])
+        end = start
+    return segments[::-1]
+
+
+def _segment_greedy(target: str) -> List['str']:
     forward_en = _segment_forward(target)
     backward_en = _segment_backward(target)
     forward_pkg = _segment_forward(target, corpus_key_queue = ['packages', 'en'])
@@ -1,43 +1,126 @@
 
+"""
+Word vector similarity. The fastText vectors are opened on first use and memory-mapped read-only, so processes which
+never reach a similarity lookup do not load them and all processes on a machine share one page-cache copy.
+"""
 
-from gensim.models import  KeyedVectors
+import os.path as osp, os
+from functools import lru_cache
+from typing import Iterable, List, Sequence, Tuple
+
+import numpy as np
 
-from core import utils
 from core import tokens
+from core import profiles
 import pry
 
-WORD_VECTOR = KeyedVectors.load('core/models/fasttext-vectors.kv')
+PATH = osp.dirname(osp.realpath(__file__))
+MODEL_PATH = os.environ.get('TYPOMIND_VECTORS', osp.join(PATH, 'models', 'fasttext-vectors.kv'))
+SIMILARITY_THRESHOLD = 0.65
+
+_word_vector = None
+
+
+def set_model_path(path: str) -> None:
+    """Points the lazy loader at another saved KeyedVectors model."""
+    global MODEL_PATH, _word_vector
+    MODEL_PATH = path
+    _word_vector = None
+    unit_vector.cache_clear()
+
+
+def get_word_vector():
+    global _word_vector
+    if _word_vector is None:
+        from gensim.models import KeyedVectors
+        _word_vector = KeyedVectors.load(MODEL_PATH, mmap = 'r')
+    return _word_vector
+
+
+def __getattr__(name: str):
+    if name == 'WORD_VECTOR':  # loaded lazily, see get_word_vector
+        return get_word_vector()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
 
 def get_similarity(first_word, second_word):
 	try:
-		similarity = WORD_VECTOR.similarity(first_word, second_word)
+		similarity = get_word_vector().similarity(first_word, second_word)
 	except KeyError:
 		similarity = 0
 	return similarity
 
-def is_semantically_similar(base_token, adverserial_token):
-    bt, at = [b for b in base_token if b not in adverserial_token], [a for a in adverserial_token if a not in base_token]
+@lru_cache(2**16)
+def unit_vector(word: str) -> np.ndarray:
+    """Normalized vector of word, zeros if the model has none, so its similarity to anything is 0 as in get_similarity."""
+    word_vector = get_word_vector()
+    try:
+        return np.asarray(word_vector.get_vector(word, norm = True), dtype = np.float32)
+    except KeyError:
+        return np.zeros(word_vector.vectors.shape[1], dtype = np.float32)
 
-    permutations = [(x,y) for x in bt for y in at]
-    
-    if len(permutations) == 0:
-        return False
 
-    total_similarity = 0
-    for combination in permutations:
-        total_similarity += get_similarity(combination[0], combination[1])
-    
-    similarity_ratio = total_similarity / len(permutations)
+def unit_vectors(words: Sequence[str]) -> np.ndarray:
+    return np.stack([unit_vector(w) for w in words])
+
+
+def similarity_matrix(first_words: Sequence[str], second_words: Sequence[str]) -> np.ndarray:
+    """Cosine similarity of every first word to every second word, in one matrix product."""
+    return unit_vectors(first_words) @ unit_vectors(second_words).T
+
 
-    # print(f"{str(base_token)} and {str(adverserial_token)} have similarity ratio of {similarity_ratio}")
-    if similarity_ratio < 0.65:
+def _substituted(base_token, adverserial_token) -> Tuple[List[str], List[str]]:
+    """Tokens of each side missing from the other."""
+    return [b for b in base_token if b not in adverserial_token], [a for a in adverserial_token if a not in base_token]
+
+
+def is_semantically_similar(base_token, adverserial_token):
+    bt, at = _substituted(base_token, adverserial_token)
+    if len(bt) == 0 or len(at) == 0:
         return False
-    
-    return True
+
+    # mean similarity over every (base, adversarial) token combination
+    similarity_ratio = float(similarity_matrix(bt, at).sum(dtype = np.float64)) / (len(bt) * len(at))
+    return similarity_ratio >= SIMILARITY_THRESHOLD
+
+
+def similarity_ratios(token_pairs: Iterable[Tuple[Sequence[str], Sequence[str]]]) -> np.ndarray:
+    """Mean similarity of the substituted tokens of many (base tokens, adversarial tokens) pairs at once, NaN where one
+    side has none. The vectors of all tokens are gathered once and the similarities computed in a single batch.
+    """
+    substituted = [_substituted(bt, at) for bt, at in token_pairs]
+    vocabulary = {}
+    first, second, sizes = [], [], []
+    for bt, at in substituted:
+        sizes.append(len(bt) * len(at))
+        for b in bt:
+            for a in at:
+                first.append(vocabulary.setdefault(b, len(vocabulary)))
+                second.append(vocabulary.setdefault(a, len(vocabulary)))
+    ratios = np.full(len(sizes), np.nan)
+    if not first: return ratios
+    vectors = unit_vectors(list(vocabulary))
+    similarities = np.einsum('ij,ij->i', vectors[first], vectors[second]).astype(np.float64)
+    sizes = np.array(sizes)
+    nonempty = sizes > 0
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))[nonempty]
+    ratios[nonempty] = np.add.reduceat(similarities, starts) / sizes[nonempty]
+    return ratios
+
+
+def package_similarity_ratios(pkg_pairs: Iterable[Tuple[str, str]]) -> np.ndarray:
+    """similarity_ratios of the token sequences of many (base, adversarial) package names."""
+    return similarity_ratios((profiles.get_profile(b).sequence, profiles.get_profile(a).sequence) for b, a in pkg_pairs)
+
+
+def are_semantically_similar(token_pairs: Iterable[Tuple[Sequence[str], Sequence[str]]]) -> np.ndarray:
+    """Same as [is_semantically_similar(bt, at) for bt, at in token_pairs], batched."""
+    ratios = similarity_ratios(token_pairs)
+    return np.nan_to_num(ratios, nan = -1.0) >= SIMILARITY_THRESHOLD
 
 def check_asemantic(base_token, adversarial_token, popularity_threshold: float = 0.02502):  # recall first drops below 0.02502, threshold seems to be very sensitive
-    base_normalized = utils.to_sequence(base_token)
-    adversarial_normalized = utils.to_sequence(adversarial_token)
+    base_normalized = list(profiles.get_profile(base_token).sequence)
+    adversarial_normalized = list(profiles.get_profile(adversarial_token).sequence)
 
     base_len = len(base_normalized)
     adverserial_len = len(adversarial_normalized)
@@ -0,0 +1,251 @@
+"""
+Long-lived detection server keeping the corpora, models and indexes of the popular packages resident in memory.
+
+Requests are JSON over HTTP, on a TCP port or a Unix socket:
+    POST /classify  {"pairs": [[base, adv], ...]} or {"base": ..., "adv": ...}
+                    -> {"results": [record, ...]}, one record per pair
+    POST /imitates  {"names": [adv, ...]} or {"name": ...}
+                    -> {"results": {adv: [record, ...]}}, the positive records against the popular packages
+    GET  /health    -> {"status": "ok", "base_pkgs": ...}
+
+Records follow the output schema of core/sinks.py, with an "error" field for pairs whose classification raised.
+/classify requests of more than batch_size pairs are rejected, the candidate pairs of an /imitates request are queued
+in batch_size chunks.
+
+Every request is answered by its own thread, but the pairs are classified by a single batcher: it collects the pairs
+of all requests arriving within batch_wait seconds (at most batch_size pairs) and splits them across a pool of worker
+processes forked after everything was loaded, so the workers share the corpora copy-on-write. Request threads only
+look up candidates, scope confusions included, every classification runs in the batcher. A batch which is not
+classified within batch_timeout seconds (e.g. because a worker died) fails with 503 and the pool is replaced. Forking
+the threaded server could copy locks held by other threads, so the replacement workers are started by a fork server
+and load the resources themselves.
+"""
+
+import gc
+import json
+import logging
+import multiprocessing as mp
+import multiprocessing.pool
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Collection, Dict, Iterable, List, Optional, Tuple
+
+from core import semantic, segmentation
+from core.candidates import CandidateIndex
+from core.detectors import required_resources, load_resources, set_scope_index
+from core.scan import ScanResult, classify_pair, chunked
+from core.scopes import ScopeIndex
+from core.sinks import to_record
+
+MAX_BODY_SIZE = 2**20
+
+
+def classify_pairs(pairs: List[Tuple[str, str]], classify_kwargs: dict) -> List[ScanResult]:
+    """classify_pair of every pair, including the negative ones."""
+    return [classify_pair(pair, **classify_kwargs) for pair in pairs]
+
+
+def init_worker(resources: Collection[str], segmenter: str, model_path: str) -> None:
+    """Brings a worker started by a fork server to the state of the server process."""
+    semantic.set_model_path(model_path)
+    segmentation.set_segmenter(segmenter)
+    load_resources(resources)
+
+
+def to_response(result: ScanResult) -> Dict:
+    record = to_record(result)
+    if result.error is not None: record['error'] = result.error
+    return record
+
+
+class DetectionService:
+    """Indexes the popular packages and classifies pairs in batches."""
+
+    def __init__(self, base_pkgs: Iterable[str], workers: int = 1, batch_size: int = 1000, batch_wait: float = 0.005,
+            batch_timeout: float = 60, detectors: Optional[Collection[int]] = None, **classify_kwargs) -> None:
+        """classify_kwargs (early_exit, skip_expensive) are passed on to classify_typosquat."""
+        self.base_pkgs = sorted({pkg for pkg in base_pkgs if pkg})
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.batch_timeout = batch_timeout
+        self.classify_kwargs = dict(classify_kwargs, detectors = detectors)
+        load_resources(required_resources(detectors))
+        self.index = CandidateIndex(self.base_pkgs, detectors = detectors)
+        self.scope_index = ScopeIndex(self.base_pkgs) if detectors is None or 11 in detectors else None
+        set_scope_index(self.scope_index)  # ScopeConfusion reads its relations, in the forked workers too
+        self.workers = workers
+        self.pool = None
+        if workers > 1:  # forked before any thread is started
+            gc.freeze()
+            self.pool = self._make_pool()
+        self._pending = queue.Queue()
+        self._batcher = threading.Thread(target = self._run_batches, daemon = True)
+        self._batcher.start()
+
+    def close(self) -> None:
+        self._pending.put(None)
+        self._batcher.join()
+        if self.pool:
+            self.pool.terminate()
+            self.pool.join()
+
+    def _make_pool(self, method: str = 'fork') -> mp.pool.Pool:
+        """Forked workers share everything loaded so far, only fork before any thread is started."""
+        if method == 'fork': return mp.get_context('fork').Pool(self.workers)
+        initargs = (required_resources(self.classify_kwargs['detectors']), segmentation.SEGMENTER, semantic.MODEL_PATH)
+        return mp.get_context(method).Pool(self.workers, initializer = init_worker, initargs = initargs)
+
+    def _restart_pool(self) -> None:
+        """Replaces a pool which lost or hangs on a task, from the batcher thread."""
+        self.pool.terminate()
+        self.pool.join()
+        self.pool = self._make_pool('forkserver')
+        self.pool.apply(len, ((),))  # a worker loaded the resources, not counted against the next batch's timeout
+
+    def classify(self, pairs: List[Tuple[str, str]]) -> List[ScanResult]:
+        """Results of pairs in order, classified along with the pairs of concurrent requests."""
+        if not pairs: return []
+        if len(pairs) > self.batch_size: raise ValueError(f'{len(pairs)} pairs in one request, at most {self.batch_size} are allowed')
+        return self._submit(pairs).result()
+
+    def _submit(self, pairs: List[Tuple[str, str]]) -> Future:
+        future = Future()
+        self._pending.put((pairs, future))
+        return future
+
+    def imitated(self, adv_pkgs: List[str]) -> Dict[str, List[ScanResult]]:
+        """Positive results of every adv_pkg against the popular packages it may imitate."""
+        adv_pkgs, pairs = list(dict.fromkeys(adv_pkgs)), []
+        for adv_pkg in adv_pkgs:
+            candidates = self.index.candidates(adv_pkg)
+            if self.scope_index is not None:  # confirmed by ScopeConfusion in the batcher
+                candidates |= self.scope_index.imitated(adv_pkg, confirmed = False)
+            pairs += [(base_pkg, adv_pkg) for base_pkg in sorted(candidates)]
+        found = {adv_pkg: [] for adv_pkg in adv_pkgs}
+        futures = [self._submit(chunk) for chunk in chunked(pairs, self.batch_size)]
+        for future in futures:
+            for result in future.result():
+                if result.classifications: found[result.adv_pkg].append(result)
+        return found
+
+    def _next_batch(self) -> Optional[List[Tuple[List[Tuple[str, str]], Future]]]:
+        """Blocks for a request, then gathers more for up to batch_wait seconds. None once closed."""
+        request = self._pending.get()
+        if request is None: return None
+        batch, size = [request], len(request[0])
+        deadline = time.monotonic() + self.batch_wait
+        while size < self.batch_size:
+            try:
+                request = self._pending.get(timeout = max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if request is None:
+                self._pending.put(None)  # stop after this batch
+                break
+            batch.append(request)
+            size += len(request[0])
+        return batch
+
+    def _run_batches(self) -> None:
+        while (batch := self._next_batch()) is not None:
+            pairs = [pair for request_pairs, _ in batch for pair in request_pairs]
+            try:
+                if self.pool is None:
+                    results = classify_pairs(pairs, self.classify_kwargs)
+                else:
+                    chunk_size = max(1, -(-len(pairs) // self.workers))
+                    chunks = self.pool.starmap_async(classify_pairs, [(chunk, self.classify_kwargs) for chunk in chunked(pairs, chunk_size)])
+                    results = [r for chunk in chunks.get(self.batch_timeout) for r in chunk]
+            except mp.TimeoutError:
+                logging.error(f'{len(pairs)} pairs not classified within {self.batch_timeout}s, restarting the workers')
+                self._restart_pool()
+                for _, future in batch: future.set_exception(RuntimeError(f'not classified within {self.batch_timeout}s'))
+                continue
+            except Exception as e:
+                for _, future in batch: future.set_exception(e)
+                continue
+            start = 0
+            for request_pairs, future in batch:
+                future.set_result(results[start:start + len(request_pairs)])
+                start += len(request_pairs)
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    server: 'DetectionServer'
+
+    def address_string(self) -> str:
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    def log_message(self, format: str, *args) -> None:
+        logging.debug(f'{self.address_string()} {format % args}')
+
+    def _reply(self, status: int, body: Dict) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_json(self) -> Dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        if length < 0: raise ValueError(f'invalid Content-Length {length}')
+        if length > MAX_BODY_SIZE: raise ValueError(f'request body larger than {MAX_BODY_SIZE} bytes')
+        body = json.loads(self.rfile.read(length) or b'{}')
+        if not isinstance(body, dict): raise ValueError('expected a JSON object')
+        return body
+
+    def do_GET(self) -> None:
+        if self.path == '/health':
+            self._reply(200, {'status': 'ok', 'base_pkgs': len(self.server.service.base_pkgs)})
+        else:
+            self._reply(404, {'error': f'unknown path {self.path}'})
+
+    def do_POST(self) -> None:
+        service = self.server.service
+        try:
+            body = self._read_json()
+            if self.path == '/classify':
+                pairs = [(b, a) for b, a in body['pairs']] if 'pairs' in body else [(body['base'], body['adv'])]
+                if not all(isinstance(b, str) and isinstance(a, str) for b, a in pairs): raise ValueError('names must be strings')
+                self._reply(200, {'results': [to_response(r) for r in service.classify(pairs)]})
+            elif self.path == '/imitates':
+                names = body['names'] if 'names' in body else [body['name']]
+                if not all(isinstance(n, str) for n in names): raise ValueError('names must be strings')
+                found = service.imitated(names)
+                self._reply(200, {'results': {n: [to_response(r) for r in results] for n, results in found.items()}})
+            else:
+                self._reply(404, {'error': f'unknown path {self.path}'})
+        except (ValueError, KeyError, TypeError) as e:
+            self._reply(400, {'error': f'bad request: {e!r}'})
+        except RuntimeError as e:
+            self._reply(503, {'error': f'classification failed: {e}'})
+
+
+class DetectionServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], service: DetectionService) -> None:
+        self.service = service
+        super().__init__(address, RequestHandler)
+
+
+class UnixDetectionServer(DetectionServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self) -> None:
+        if os.path.exists(self.server_address): os.unlink(self.server_address)
+        socketserver.TCPServer.server_bind(self)
+        self.server_name, self.server_port = 'localhost', 0
+
+
+def make_server(service: DetectionService, host: str = '127.0.0.1', port: int = 8765, unix_socket: Optional[str] = None) -> DetectionServer:
+    """Server bound to unix_socket if given, to host:port otherwise (port 0 picks a free one)."""
+    if unix_socket: return UnixDetectionServer(unix_socket, service)
+    return DetectionServer((host, port), service)
@@ -0,0 +1,237 @@
+"""
+Buffered result writers. Records are queued by the scan loop and written in batches by a background thread.
+
+Every backend writes the same schema:
+    base        base package name
+    adversarial adversarial package name
+    detectors   detector keys which fired (see tools/label_maps.py)
+    counts      number of times each of those detectors fired
+    elapsed_ms  time spent classifying the pair
+
+Kept free of detector imports so the output tools can use it without loading the corpora.
+"""
+
+import csv
+import json
+import os
+import os.path as osp
+import queue
+import threading
+from abc import ABCMeta, abstractmethod
+from typing import Dict, Iterator, List, Optional
+
+FIELDS = ('base', 'adversarial', 'detectors', 'counts', 'elapsed_ms')
+
+
+def to_record(result: 'ScanResult') -> Dict:
+    items = sorted(result.classifications.items())
+    return {
+        'base': result.base_pkg,
+        'adversarial': result.adv_pkg,
+        'detectors': [key for (key, _), _ in items],
+        'counts': [int(count) for _, count in items],
+        'elapsed_ms': round(result.elapsed.total_seconds() * 1000, 3),
+    }
+
+
+class ResultSink(metaclass = ABCMeta):
+    """Base class, subclasses implement _open, _write_batch and _close."""
+    ext = None
+
+    def __init__(self, path: str, batch_size: int = 1000, max_pending: int = 64, append: bool = True) -> None:
+        self.path = path
+        self.mode = 'a' if append else 'w'
+        self.batch_size = batch_size
+        self._batch: List[Dict] = []
+        self._queue = queue.Queue(maxsize = max_pending)  # bounded, so a slow disk throttles the scan
+        self._error: Optional[BaseException] = None
+        self._open()
+        self._thread = threading.Thread(target = self._drain, daemon = True)
+        self._thread.start()
+
+    def __enter__(self) -> 'ResultSink':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def write(self, result: 'ScanResult') -> None:
+        self.write_record(to_record(result))
+
+    def write_record(self, record: Dict) -> None:
+        self._batch.append(record)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._error: raise self._error
+        if self._batch:
+            self._queue.put(self._batch)
+            self._batch = []
+
+    def sync(self) -> None:
+        """Blocks until everything written so far is on disk."""
+        self.flush()
+        self._queue.join()
+        if self._error: raise self._error
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        finally:  # the writer is stopped and the file closed even if a batch failed
+            self._queue.put(None)
+            self._thread.join()
+            self._close()
+        if self._error: raise self._error
+
+    def _drain(self) -> None:
+        while (batch := self._queue.get()) is not None:
+            try:
+                self._write_batch(batch)
+            except BaseException as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    @abstractmethod
+    def _open(self) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def _write_batch(self, records: List[Dict]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def _close(self) -> None:
+        raise NotImplementedError
+
+
+class JSONLSink(ResultSink):
+    ext = 'jsonl'
+
+    def _open(self) -> None:
+        self._file = open(self.path, self.mode)
+
+    def _write_batch(self, records: List[Dict]) -> None:
+        self._file.write(''.join(json.dumps(r) + '\n' for r in records))
+        self._file.flush()
+
+    def _close(self) -> None:
+        self._file.close()
+
+
+class CSVSink(ResultSink):
+    """List fields are joined with ';'."""
+    ext = 'csv'
+
+    def _open(self) -> None:
+        is_new = self.mode == 'w' or not osp.isfile(self.path) or osp.getsize(self.path) == 0
+        self._file = open(self.path, self.mode, newline = '')
+        self._writer = csv.writer(self._file)
+        if is_new:
+            self._writer.writerow(FIELDS)
+            self._file.flush()
+
+    def _write_batch(self, records: List[Dict]) -> None:
+        self._writer.writerows(
+            [r['base'], r['adversarial'], ';'.join(map(str, r['detectors'])), ';'.join(map(str, r['counts'])), r['elapsed_ms']]
+            for r in records
+        )
+        self._file.flush()
+
+    def _close(self) -> None:
+        self._file.close()
+
+
+class ParquetSink(ResultSink):
+    """Every batch becomes a row group. Parquet files cannot be appended to, open with append = False to replace one."""
+    ext = 'parquet'
+
+    def _open(self) -> None:
+        if self.mode == 'a':
+            raise ValueError(f'cannot append to "{self.path}", parquet files can only be written from scratch')
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self._pa = pa
+        self._schema = pa.schema([
+            ('base', pa.string()),
+            ('adversarial', pa.string()),
+            ('detectors', pa.list_(pa.int8())),
+            ('counts', pa.list_(pa.int32())),
+            ('elapsed_ms', pa.float64()),
+        ])
+        self._writer = pq.ParquetWriter(self.path, self._schema)
+
+    def _write_batch(self, records: List[Dict]) -> None:
+        self._writer.write_table(self._pa.Table.from_pylist(records, schema = self._schema))
+
+    def _close(self) -> None:
+        self._writer.close()
+
+
+class TextSink(ResultSink):
+    """Legacy "('base', 'adv'): {categories}, elapsed" lines."""
+    ext = 'txt'
+
+    def _open(self) -> None:
+        self._file = open(self.path, self.mode)
+
+    def write(self, result: 'ScanResult') -> None:
+        classifications = {name: c for (_, name), c in result.classifications.items()}
+        super().write_record(f'(\'{result.base_pkg}\', \'{result.adv_pkg}\'): {classifications}, {format(result.elapsed)}\n')
+
+    def write_record(self, record: Dict) -> None:
+        raise TypeError('text output only holds detector names, write ScanResults or use a structured format')
+
+    def _write_batch(self, records: List[str]) -> None:
+        self._file.write(''.join(records))
+        self._file.flush()
+
+    def _close(self) -> None:
+        self._file.close()
+
+
+SINKS = {sink.ext: sink for sink in (JSONLSink, CSVSink, ParquetSink, TextSink)}
+
+
+def sink_format(path: str, fmt: str = None) -> str:
+    """fmt, or the format inferred from the extension of path (anything unknown is written as text)."""
+    fmt = fmt or path.rsplit('.', 1)[-1].lower()
+    if fmt == 'json': fmt = 'jsonl'
+    return fmt if fmt in SINKS else TextSink.ext
+
+
+def rollback(path: str, size: int) -> None:
+    """Truncates path to size bytes, dropping the records written after it had that size, e.g. by an unfinished unit."""
+    current = osp.getsize(path) if osp.isfile(path) else 0
+    if current < size:
+        raise ValueError(f'"{path}" holds {current} bytes but {size} bytes of results were recorded, it was modified')
+    if osp.isfile(path): os.truncate(path, size)
+
+
+def open_sink(path: str, fmt: str = None, **kwargs) -> ResultSink:
+    """Opens the sink for fmt, or infers it from the extension of path."""
+    return SINKS[sink_format(path, fmt)](path, **kwargs)
+
+
+def read_records(path: str, fmt: str = None) -> Iterator[Dict]:
+    """Reads back the records written by a JSONL, CSV or Parquet sink."""
+    fmt = fmt or path.rsplit('.', 1)[-1].lower()
+    if fmt in {'jsonl', 'json'}:
+        with open(path, 'r') as f:
+            yield from (json.loads(line) for line in f if line.strip())
+    elif fmt == 'csv':
+        with open(path, 'r', newline = '') as f:
+            for row in csv.DictReader(f):
+                yield {
+                    'base': row['base'],
+                    'adversarial': row['adversarial'],
+                    'detectors': [int(k) for k in row['detectors'].split(';') if k],
+                    'counts': [int(c) for c in row['counts'].split(';') if c],
+                    'elapsed_ms': float(row['elapsed_ms']),
+                }
+    elif fmt == 'parquet':
+        import pyarrow.parquet as pq
+        yield from pq.read_table(path).to_pylist()
+    else:
+        raise TypeError(f'"{path}" is not a structured result file, currently supports *.jsonl, *.csv and *.parquet')
@@ -1,49 +1,157 @@
 """
+Token corpora used by the segmenter and detectors.
 
+Deriving the corpora from their sources (decompressing the package token pickle, lemmatizing the NLTK words corpus) is
+slow, so the derived corpora are written to a versioned snapshot next to the sources. Loading the snapshot is a single
+unpickle, every process still gets its own copy of the corpora (fork after loading to share them). It is rebuilt
+automatically whenever a source, the minimum token count or SNAPSHOT_VERSION changes. `tools/build_corpus_snapshot.py` builds it ahead of a run.
+
+The corpora are loaded on first access, so runs which only use lexical detectors never load them.
 """
 
 import sys; sys.path.append('.')
 import os.path as osp, os
 
-from nltk.corpus import words
-
 import json
-import compress_pickle
-
-from icecream import ic
-
-from core import nlp_tools
+import mmap
+import pickle
+import hashlib
+import logging
+import tempfile
+from importlib import metadata
 
 
 # statics
 PATH = osp.dirname(osp.realpath(__file__))
 
 DATA_PATH = osp.join(PATH, '..', 'data')
-PKG_TOKENS_PATH = osp.join(DATA_PATH, 'token_sets', 'pkg_tokens.gz')  
+PKG_TOKENS_PATH = osp.join(DATA_PATH, 'token_sets', 'pkg_tokens.gz')
 AM_TO_BR_PATH = osp.join(DATA_PATH, 'translations', 'am_to_br.json')
+SNAPSHOT_PATH = osp.join(DATA_PATH, 'token_sets', 'corpora.snapshot')
+SNAPSHOT_VERSION = 3
+MIN_TOKEN_COUNT = 100
+
+
+def _version(package: str) -> str:
+    try:
+        return metadata.version(package)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def source_signature() -> str:
+    """Changes whenever the snapshot would be built differently."""
+    # nltk ships the words corpus and lemmatizer, jellyfish the phonetic keys
+    digest = hashlib.sha1(f'{SNAPSHOT_VERSION}:{MIN_TOKEN_COUNT}:{_version("nltk")}:{_version("jellyfish")}'.encode())
+    for path in (PKG_TOKENS_PATH, AM_TO_BR_PATH):
+        stat = os.stat(path)
+        digest.update(f':{osp.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}'.encode())
+    return digest.hexdigest()
+
+
+def build_snapshot() -> dict:
+    """Derives the corpora from their sources."""
+    import compress_pickle
+    from nltk.corpus import words
+    from jellyfish import soundex, metaphone
+    from core import nlp_tools
+
+    with open(PKG_TOKENS_PATH, 'rb') as f:
+        token_dict = {k: v for k, v in compress_pickle.load(f).items() if v['count'] >= MIN_TOKEN_COUNT}
+
+    with open(AM_TO_BR_PATH, 'r') as f:
+        # source: https://github.com/hyperreality/American-British-English-Translator
+        am_to_br = json.load(f)
+
+    # lemma of every corpus token, a token which is its own lemma maps to the same (interned) string
+    lemmatizer = nlp_tools.get_lemmatizer()
+    lemmas = {}
+    def add_lemmas(targets):
+        for t in targets:
+            t = sys.intern(t)
+            if t in lemmas: continue
+            lemma = lemmatizer.lemmatize(t)
+            lemmas[t] = t if lemma == t else sys.intern(lemma)
+
+    en_words = set(words.words()) | set(am_to_br.keys()) | set(am_to_br.values())
+    add_lemmas(en_words)
+    en_tokens = {lemmas[t] for t in en_words}
+    add_lemmas(en_tokens | set(token_dict))
+    pkg_token_sorted_rank = sorted(
+            [(k, len(v['src'])) for k, v in token_dict.items()],
+            key = lambda item: item[1], reverse = True
+        )
+    phonetic_keys = {t: (soundex(t), metaphone(t)) for t in en_tokens | set(token_dict)}
+    return {'am_to_br': am_to_br, 'en_tokens': en_tokens, 'pkg_token_sorted_rank': pkg_token_sorted_rank, 'phonetic_keys': phonetic_keys, 'lemmas': lemmas}
+
+
+def write_snapshot(snapshot: dict, signature: str, path: str = SNAPSHOT_PATH) -> None:
+    """Header line followed by the pickled corpora, replaced atomically so concurrent builders cannot clash."""
+    header = json.dumps({'version': SNAPSHOT_VERSION, 'signature': signature}).encode() + b'\n'
+    fd, tmp_path = tempfile.mkstemp(dir = osp.dirname(path), prefix = '.corpora-')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(header)
+        pickle.dump(snapshot, f, protocol = pickle.HIGHEST_PROTOCOL)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(signature: str, path: str = SNAPSHOT_PATH) -> dict:
+    """Returns the snapshot at path, or None if it is missing or was built from different sources."""
+    if not osp.isfile(path): return None
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as mm:
+        offset = mm.find(b'\n') + 1
+        header = json.loads(mm[:offset])
+        if header.get('version') != SNAPSHOT_VERSION or header.get('signature') != signature: return None
+        view = memoryview(mm)[offset:]
+        try:
+            return pickle.loads(view)
+        finally:
+            view.release()
+
+
+def load_snapshot(rebuild: bool = False) -> dict:
+    signature = source_signature()
+    snapshot = None if rebuild else read_snapshot(signature)
+    if snapshot is None:
+        snapshot = build_snapshot()
+        try:
+            write_snapshot(snapshot, signature)
+        except OSError as e:  # read-only checkout, the next run derives the corpora again
+            logging.warning(f'Could not write corpus snapshot: {e}')
+    return snapshot
+
+
+LAZY_ATTRIBUTES = {'AM_TO_BR', 'EN_TOKENS', 'PKG_TOKEN_SORTED_RANK', 'PKG_TOKENS', 'PKG_TOKEN_TO_RANK', 'ALL_TOKENS', 'TECH_TOKENS', 'PHONETIC_KEYS', 'LEMMAS', 'corpora'}
+
+
+def load() -> None:
+    """Loads the corpora into the module namespace, done on first access of any of LAZY_ATTRIBUTES."""
+    global AM_TO_BR, EN_TOKENS, PKG_TOKEN_SORTED_RANK, PKG_TOKENS, PKG_TOKEN_TO_RANK, ALL_TOKENS, TECH_TOKENS, PHONETIC_KEYS, LEMMAS, corpora
+    if 'corpora' in globals(): return
+    _snapshot = load_snapshot()
+
+    AM_TO_BR = _snapshot['am_to_br']
+    EN_TOKENS = _snapshot['en_tokens']
+    PKG_TOKEN_SORTED_RANK = _snapshot['pkg_token_sorted_rank']
+    PKG_TOKENS = {k for k, _ in PKG_TOKEN_SORTED_RANK}
+    _max_num_src = max(PKG_TOKEN_SORTED_RANK, key = lambda pair: (lambda key, num_src: num_src)(*pair))[1]
+    PKG_TOKEN_TO_RANK = {token: num_src / _max_num_src for token, num_src in PKG_TOKEN_SORTED_RANK}
+    ALL_TOKENS = PKG_TOKENS | EN_TOKENS
+    TECH_TOKENS = PKG_TOKENS - EN_TOKENS
+    PHONETIC_KEYS = _snapshot['phonetic_keys']  # (soundex, metaphone) of every token in ALL_TOKENS
+    LEMMAS = _snapshot['lemmas']  # WordNet lemma of every token in ALL_TOKENS and the words corpus
+
+    corpora = {
+        'en': EN_TOKENS,
+        'packages': PKG_TOKENS,
+        'tech': TECH_TOKENS,
+        'all': ALL_TOKENS,
+    }
+
 
-with open(PKG_TOKENS_PATH, 'rb') as f:
-    TOKEN_DICT = {k: v for k, v in compress_pickle.load(f).items() if v['count'] >= 100}
-
-with open(AM_TO_BR_PATH, 'r') as f:
-    # source: https://github.com/hyperreality/American-British-English-Translator
-    AM_TO_BR = json.load(f)
-
-EN_TOKENS = set(words.words()) | set(AM_TO_BR.keys()) | set(AM_TO_BR.values())
-EN_TOKENS = {nlp_tools.lemmatize(t) for t in EN_TOKENS}  
-PKG_TOKENS = set(TOKEN_DICT.keys())
-PKG_TOKEN_SORTED_RANK = sorted(  
-        [(k, len(v['src'])) for k, v in TOKEN_DICT.items()],
-        key = lambda item: item[1], reverse = True
-    )
-_max_num_src = max(PKG_TOKEN_SORTED_RANK, key = lambda pair: (lambda key, num_src: num_src)(*pair))[1]
-PKG_TOKEN_TO_RANK = {token: num_src / _max_num_src for token, num_src in PKG_TOKEN_SORTED_RANK}
-ALL_TOKENS = PKG_TOKENS | EN_TOKENS
-TECH_TOKENS = PKG_TOKENS - EN_TOKENS
-
-corpora = {
-    'en': EN_TOKENS,
-    'packages': PKG_TOKENS,
-    'tech': TECH_TOKENS,
-    'all': ALL_TOKENS,
-}
\ No newline at end of file
+def __getattr__(name: str):
+    if name in LAZY_ATTRIBUTES:
+        load()
+        return globals()[name]
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -1,16 +1,16 @@
 
 import re
 import os.path as osp, os
+from collections import Counter
 from functools import reduce
 from functools import lru_cache
-from typing import List
+from typing import List, Optional, Sequence
 
 from pyxdameraulevenshtein import damerau_levenshtein_distance as edit_distance
 
 from icecream import ic
 from pipe import traverse
 
-from core.semantic import get_similarity
 from core import tokens
 from core.segmentation import segment
 
@@ -43,6 +43,70 @@ def DL_dist(target1: str, target2: str) -> int:
     return edit_distance(target1, target2)
 
 
+def next_DL_row(target: str, prev_row: List[int], prev_prev_row: Optional[List[int]], char: str, prev_char: Optional[str]) -> List[int]:
+    """Row of DL_dist's (optimal string alignment) table for one more character appended to the compared string."""
+    row = [prev_row[0] + 1]
+    for j in range(1, len(target) + 1):
+        dist = min(prev_row[j] + 1, row[j - 1] + 1, prev_row[j - 1] + (char != target[j - 1]))
+        if prev_prev_row is not None and j > 1 and char == target[j - 2] and prev_char == target[j - 1]:
+            dist = min(dist, prev_prev_row[j - 2] + 1)
+        row.append(dist)
+    return row
+
+
+def permuted_DL_dist(target: str, tokens: Sequence[str], max_dist: int = 2, sep: str = '_') -> int:
+    """DL_dist(target, sep.join(p)) of the first p in permutations(tokens) for which it is in [1, max_dist], else 0.
+
+    The permutations are walked depth first in the order of itertools.permutations, the distance table is extended one
+    character at a time and a prefix is dropped as soon as no completion of it can be within max_dist, so the cost is
+    no longer factorial in the number of tokens.
+    """
+    length = sum(len(t) for t in tokens) + len(sep) * (len(tokens) - 1)
+    if abs(length - len(target)) > max_dist: return 0
+    chars = Counter(sep * (len(tokens) - 1) + ''.join(tokens))
+    target_chars = Counter(target)
+    # an edit changes at most 2 characters of the multiset
+    if sum(((chars - target_chars) + (target_chars - chars)).values()) > 2 * max_dist: return 0
+
+    def search(rows: tuple, prev_char: Optional[str], remaining: tuple) -> int:
+        if not remaining:
+            dist = rows[-1][-1]
+            return dist if 1 <= dist <= max_dist else 0
+        seen = set()
+        for i, token in enumerate(remaining):
+            if token in seen: continue  # same strings as the first occurrence, already searched
+            seen.add(token)
+            next_rows, next_char = rows, prev_char
+            for char in (token if len(remaining) == len(tokens) else sep + token):
+                next_rows = (next_rows[-1], next_DL_row(target, next_rows[-1], next_rows[0], char, next_char))
+                next_char = char
+                if min(next_rows[0]) > max_dist and min(next_rows[1]) > max_dist: break  # distances never decrease
+            else:
+                dist = search(next_rows, next_char, remaining[:i] + remaining[i + 1:])
+                if dist: return dist
+        return 0
+
+    return search((None, list(range(len(target) + 1))), None, tuple(tokens))
+
+
+def is_permuted_concatenation(target: str, tokens: Sequence[str]) -> bool:
+    """Whether target == ''.join(p) for some p in permutations(tokens), without enumerating them."""
+    if len(target) != sum(len(t) for t in tokens): return False
+    counts = Counter(tokens)
+
+    def match(start: int) -> bool:
+        if start == len(target): return True
+        for token, count in counts.items():
+            if count and target.startswith(token, start):
+                counts[token] -= 1
+                matched = match(start + len(token))
+                counts[token] += 1
+                if matched: return True
+        return False
+
+    return match(0)
+
+
 def sorted_tokens(target: str, deep = True) -> str:
     base_delims = [char for char in target if char in DELIMITERS]
     sorted_base_seq = to_sorted_sequence(target, deep = deep)
@@ -3,11 +3,13 @@ Tests delimiter-less segmentation
 """
 
 import sys; sys.path.append('.')
+import argparse
 from icecream import ic
 from tqdm import tqdm
 
 print('Loading segmenter...')
 from core.utils import segment
+from core import segmentation
 print('Segmenter loaded.')
 
 positives = {
@@ -118,7 +120,15 @@ negatives = {
 
 all_data = positives | {k: [k] for k in negatives}
 
+def make_argparser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description = 'evaluates the segmenter on labeled names')
+    parser.add_argument('--segmenter', '-seg', choices=segmentation.SEGMENTERS, default=segmentation.SEGMENTER, help='segmenter to evaluate')
+    return parser
+
 def main():
+    args = make_argparser().parse_args()
+    segmentation.set_segmenter(args.segmenter)
+
     segmented_negative = set()  # should NOT be segmented but got segmented
     unsegmented_negative = set()  # should NOT be segmented and was NOT segmented
     unsegmented_positve = set()  # should be segmented but was NOT segmented
@@ -0,0 +1,16 @@
+import sys
+import os.path as osp
+sys.path.append(osp.join(osp.dirname(osp.realpath(__file__)), '..'))
+
+import pytest
+
+
+@pytest.fixture(scope = 'session')
+def corpora():
+    """Skips tests which segment names when the token corpora (data/token_sets, NLTK) are not available."""
+    from core import tokens
+    try:
+        tokens.load()
+    except (ImportError, LookupError, OSError) as e:
+        pytest.skip(f'token corpora not available: {e}')
+    return tokens
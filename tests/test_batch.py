@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from core.batch import classify_pairs_batch, classify_typosquat_batch
+
+PAIRS = [('react-dom', 'dom-react'), ('lodash', 'lodahs'), ('color', 'colour'), ('express', 'unrelated'), ('@babel/core', 'babel-core'),
+         ('react', 'x' * 40), ('body-parser', 'body-parsers'), ('', 'react')]
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'early_exit': True}, {'skip_expensive': True}, {'detectors': {1, 3, 7}}])
+def test_batch_matches_classify_typosquat(corpora, kwargs):
+    from core.detectors import classify_typosquat
+    result = classify_pairs_batch(PAIRS, **kwargs)
+    assert not result.errors
+    assert [result.classifications(row) for row in range(len(PAIRS))] == [classify_typosquat(b, a, **kwargs) for b, a in PAIRS]
+    assert list(result.positive) == [row for row, (b, a) in enumerate(PAIRS) if classify_typosquat(b, a, **kwargs)]
+
+
+def test_bitmask(corpora):
+    result = classify_pairs_batch(PAIRS)
+    assert len(set(result.keys)) == len(result.keys)
+    for row in range(len(PAIRS)):
+        assert result.bitmask[row] == sum(1 << k for k, _ in result.classifications(row))
+
+
+def test_lengths_must_match():
+    with pytest.raises(ValueError):
+        classify_typosquat_batch(['react'], [])
@@ -0,0 +1,105 @@
+import json
+from itertools import product
+
+import numpy as np
+import pytest
+
+from core.candidates import CandidateIndex, candidate_pairs, deletion_neighborhood, affixes, similar_tokens
+from core.profiles import get_profile
+
+BASE_PKGS = ['react', 'react-dom', 'express', 'lodash', 'color', 'colors', 'webpack', 'body-parser', 'node-fetch',
+             '@types/node', '@babel/core', 'socket.io', 'moment', 'uuid', 'chalk']
+ADV_PKGS = ['raect', 'reactt', 'react_dom', 'dom-react', 'reactdom', 'expres', 'express-js', 'lodahs', 'l0dash',
+            'colour', 'colours', 'web-pack', 'webpacks', 'body-parsers', 'parser-body', 'fetch-node', 'nodefetch',
+            'types-node', '@typs/node', 'node', 'babel-core', '@babel/cores', 'socketio', 'momnet', 'uid', 'chalk-cli',
+            'unrelated', 'zzzz']
+# semantic substitution of names sharing no token needs the token vectors, see test_semantic_keys_pair_names_sharing_no_token
+BLOCKED_DETECTORS = {1, 2, 3, 4, 5, 6, 7, 9, 10, 11, 13}
+
+
+def test_deletion_neighborhood():
+    assert deletion_neighborhood('abc', 1) == {'abc', 'bc', 'ac', 'ab'}
+    assert 'a' in deletion_neighborhood('abc', 2) and '' not in deletion_neighborhood('abc', 2)
+
+
+def test_affixes():
+    assert affixes('abcd', 0.5) == {'ab', 'abc', 'abcd', 'cd', 'bcd'}
+
+
+def test_candidates_keep_every_positive_pair(corpora):
+    from core.detectors import classify_typosquat
+    positives = {(b, a) for b, a in product(BASE_PKGS, ADV_PKGS) if classify_typosquat(b, a, detectors = BLOCKED_DETECTORS)}
+    assert positives
+    assert positives <= set(candidate_pairs(BASE_PKGS, ADV_PKGS))
+
+
+def test_candidates_are_a_small_part_of_the_product(corpora):
+    assert len(set(candidate_pairs(BASE_PKGS, ADV_PKGS))) < len(BASE_PKGS) * len(ADV_PKGS) / 3
+
+
+def test_detector_subsets_keep_their_positives(corpora):
+    from core.detectors import classify_typosquat
+    base_pkgs, adv_pkgs = BASE_PKGS + ['css-express', 'router-vue'], ADV_PKGS + ['express-ss', 'vue-wouter']  # reordered tokens
+    for detectors in ({1}, {1, 2}, {3, 4, 6}, {7}):
+        positives = {(b, a) for b, a in product(base_pkgs, adv_pkgs) if classify_typosquat(b, a, detectors = detectors)}
+        if 1 in detectors: assert {('css-express', 'express-ss'), ('router-vue', 'vue-wouter')} <= positives
+        index = CandidateIndex(base_pkgs, detectors = detectors)
+        assert all(b in index.candidates(a) for b, a in positives)
+
+
+HOMOGRAPH_PKGS = ['lodash', 'lo-dash', 'l0dash', 'lodasb', 'lodаsh', 'lo_dаsh', 'react', 'raect', 'reαct', 'express', 'expre.ss',
+                  'exprеss', 'node-fetch', 'nodefetcb', 'n0de.fetch']
+
+
+def test_homograph_index_matches_the_detector(corpora):
+    from core.detectors import HomographicReplacement
+    from core.homographic import HomographIndex
+    detector, index = HomographicReplacement(), HomographIndex(HOMOGRAPH_PKGS)
+    expected = {(b, a) for b, a in product(HOMOGRAPH_PKGS, HOMOGRAPH_PKGS) if detector(b, a)}
+    assert {'lo-dash', 'lodash'} <= {b for b, a in expected if a == 'lodаsh'}  # cyrillic a
+    assert {(b, a) for a in HOMOGRAPH_PKGS for b in index.imitated(a)} == expected
+    assert expected <= set(candidate_pairs(HOMOGRAPH_PKGS, HOMOGRAPH_PKGS, detectors = {2}))
+    assert len(CandidateIndex(HOMOGRAPH_PKGS, detectors = {2}).candidates('lodahs')) == 0  # no deletion keys
+
+
+def test_phonetic_index_covers_the_detector(corpora):
+    from core.detectors import HomophonicSimilarity
+    from core.phonetic import PhoneticIndex
+    base_pkgs = ['request', 'commander', 'buffer-xor', 'uglify-js', 'color-string', 'async', 'socket.io', 'mongoose']
+    adv_pkgs = ['requst', 'reqquest', 'comander', 'buffur-xor', 'beffer-xor', 'uglyfi-js', 'colour-string', 'asinc', 'soket.io',
+                'mongose', 'unrelated', 'xor-buffer']
+    detector, index = HomophonicSimilarity(), PhoneticIndex(base_pkgs)
+    expected = {(b, a) for b, a in product(base_pkgs, adv_pkgs) if detector(b, a)}
+    assert len(expected) >= 8
+    assert expected <= {(b, a) for a in adv_pkgs for b in index.candidates(a)}
+    assert expected <= set(candidate_pairs(base_pkgs, adv_pkgs, detectors = {13}))
+    assert 'mongoose' not in index.candidates('unrelated')
+
+
+@pytest.fixture
+def token_vectors(tmp_path, monkeypatch, corpora):
+    """Restricted token vectors of the word vector model, as built by tools/build_token_vectors.py."""
+    from core import semantic, neighbors
+    try:
+        word_vector = semantic.get_word_vector()
+    except (ImportError, OSError) as e:
+        pytest.skip(f'word vectors not available: {e}')
+    keys = sorted(t for t in corpora.corpora['all'] if t in word_vector.key_to_index)
+    monkeypatch.setattr(neighbors, 'VECTORS_PATH', str(tmp_path / 'token-vectors.npy'))
+    monkeypatch.setattr(neighbors, 'KEYS_PATH', str(tmp_path / 'token-vectors.json'))
+    monkeypatch.setattr(neighbors, 'HNSW_PATH', str(tmp_path / 'token-vectors.hnsw'))
+    monkeypatch.setattr(neighbors, '_token_neighbors', None)
+    np.save(neighbors.VECTORS_PATH, np.stack([word_vector.get_vector(k, norm = True) for k in keys]).astype(np.float16))
+    (tmp_path / 'token-vectors.json').write_text(json.dumps(keys))
+    similar_tokens.cache_clear()
+    yield
+    similar_tokens.cache_clear()
+
+
+def test_semantic_keys_pair_names_sharing_no_token(token_vectors):
+    from core.detectors import classify_typosquat
+    positives = {(b, a) for b, a in product(BASE_PKGS, ADV_PKGS) if classify_typosquat(b, a, detectors = {8})}
+    unshared = {(b, a) for b, a in positives if not set(get_profile(b).sequence) & set(get_profile(a).sequence)}
+    assert unshared
+    assert positives <= set(candidate_pairs(BASE_PKGS, ADV_PKGS, detectors = {8}))
+    assert unshared - set(candidate_pairs(BASE_PKGS, ADV_PKGS, detectors = BLOCKED_DETECTORS))  # only paired by the sem keys
@@ -0,0 +1,74 @@
+import os.path as osp
+import runpy
+import sys
+
+import pytest
+
+from core.checkpoint import CheckpointStore
+from core.sinks import read_records, rollback
+
+MAIN_PATH = osp.join(osp.dirname(osp.realpath(__file__)), '..', '__main__.py')
+BASE_PKGS = ['react', 'express', 'lodash', 'moment', 'chalk', 'webpack', '@babel/core']
+ADV_PKGS = ['reactt', 'expres', 'lodahs', 'momnet', 'chalk-cli', 'web-pack', 'babel-core', 'unrelated']
+
+
+def test_resume_keeps_finished_units(tmp_path):
+    path = str(tmp_path / 'scan.ckpt')
+    with CheckpointStore(path, 'fp') as store:
+        store.mark_finished(0, 10, 1, output_size = 100)
+        store.mark_finished(2, 5, 0, output_size = 150)
+    with CheckpointStore(path, 'fp', resume = True) as store:
+        assert store.finished_units() == {0, 2}
+        assert store.num_finished_pairs() == 15
+        assert store.output_size() == 150
+    with CheckpointStore(path, 'fp') as store:  # a fresh scan forgets them
+        assert store.finished_units() == set() and store.output_size() is None
+
+
+def test_resume_refuses_other_inputs(tmp_path):
+    path = str(tmp_path / 'scan.ckpt')
+    CheckpointStore(path, 'fp').close()
+    with pytest.raises(ValueError):
+        CheckpointStore(path, 'other fp', resume = True)
+
+
+def test_rollback(tmp_path):
+    path = tmp_path / 'out.jsonl'
+    path.write_text('finished\nunfinished\n')
+    rollback(str(path), len('finished\n'))
+    assert path.read_text() == 'finished\n'
+    with pytest.raises(ValueError):
+        rollback(str(path), 100)
+
+
+def run_main(tmp_path, monkeypatch, *args):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'logs').mkdir(exist_ok = True)
+    base_file, adv_file = tmp_path / 'base.txt', tmp_path / 'adv.txt'
+    base_file.write_text('\n'.join(BASE_PKGS) + '\n')
+    adv_file.write_text('\n'.join(ADV_PKGS) + '\n')
+    monkeypatch.setattr(sys, 'argv', ['typomind', str(base_file), str(adv_file), '-bf', '-af', '-q', '--unit_size', '2', *args])
+    runpy.run_path(MAIN_PATH, run_name = 'typomind')['main']()
+
+
+def test_resume_after_crash_appends_only_new_results(tmp_path, monkeypatch, corpora):
+    run_main(tmp_path, monkeypatch, '-of', 'full.jsonl')
+    expected = sorted((r['base'], r['adversarial']) for r in read_records(str(tmp_path / 'full.jsonl')))
+    assert expected
+
+    # crash after the second unit's results were synced but before it was marked finished
+    mark_finished = CheckpointStore.mark_finished
+    def crashing_mark_finished(self, unit_id, *args, **kwargs):
+        if len(self.finished_units()) == 1: raise KeyboardInterrupt
+        mark_finished(self, unit_id, *args, **kwargs)
+    with monkeypatch.context() as m:
+        m.setattr(CheckpointStore, 'mark_finished', crashing_mark_finished)
+        with pytest.raises(KeyboardInterrupt):
+            run_main(tmp_path, m, '-of', 'out.jsonl', '--checkpoint', 'scan.ckpt')
+
+    run_main(tmp_path, monkeypatch, '-of', 'out.jsonl', '--checkpoint', 'scan.ckpt', '--resume')
+    assert sorted((r['base'], r['adversarial']) for r in read_records(str(tmp_path / 'out.jsonl'))) == expected
+
+    # a new checkpointed scan replaces the output instead of appending to it
+    run_main(tmp_path, monkeypatch, '-of', 'out.jsonl', '--checkpoint', 'scan.ckpt')
+    assert sorted((r['base'], r['adversarial']) for r in read_records(str(tmp_path / 'out.jsonl'))) == expected
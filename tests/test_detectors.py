@@ -0,0 +1,44 @@
+import subprocess
+import sys
+import os.path as osp
+
+import pytest
+
+from core.detectors import parse_detector_keys, required_resources
+
+REPO_PATH = osp.join(osp.dirname(osp.realpath(__file__)), '..')
+
+
+def test_parse_detector_keys():
+    assert parse_detector_keys('1, 3,7') == {1, 3, 7}
+    for spec in ('1,x', '1,99'):
+        with pytest.raises(ValueError):
+            parse_detector_keys(spec)
+
+
+def test_required_resources():
+    assert required_resources({1, 2}) == set()
+    assert required_resources({13}) == {'corpora'}
+    assert required_resources() == {'corpora', 'wordnet', 'vectors'}
+
+
+def test_lexical_detectors_load_no_resources():
+    script = ('from core.detectors import classify_typosquat; from core import tokens, semantic, nlp_tools\n'
+              'assert classify_typosquat("lodash", "lodahs", detectors = {1, 2}) == {(1, "1-step D-L dist"): 1}\n'
+              'assert "corpora" not in vars(tokens) and semantic._word_vector is None and nlp_tools.LEMMATIZER is None\n')
+    subprocess.run([sys.executable, '-c', script], cwd = REPO_PATH, check = True)
+
+
+@pytest.mark.parametrize('base, adv', [('react-dom', 'dom-react'), ('lodash', 'lodahs'), ('color', 'colour'), ('body-parser', 'body-parsers')])
+def test_early_exit_and_skip_expensive(corpora, base, adv):
+    from core.detectors import DetectorBase, EXPENSIVE_COST, classify_typosquat
+    costs = {d.key: d.cost for d in DetectorBase.enabled_inst_registry}
+    full = classify_typosquat(base, adv)
+    assert full
+    first = classify_typosquat(base, adv, early_exit = True)
+    assert len(first) == 1 and first.items() <= full.items()
+    (key, _), = first
+    assert costs[key] == min(costs[k] for k, _ in full)
+    skipped = classify_typosquat(base, adv, skip_expensive = True)
+    assert skipped.items() <= full.items()
+    assert {k for k, _ in full if costs[k] < EXPENSIVE_COST} == {k for k, _ in skipped if costs[k] < EXPENSIVE_COST}
@@ -0,0 +1,15 @@
+from core import disk_cache, segmentation
+
+
+def test_cache_is_ignored_once_the_segmenter_changes(tmp_path, monkeypatch, corpora):
+    path = str(tmp_path / 'cache.sqlite')
+    monkeypatch.setattr(disk_cache, 'CACHE_PATH', path)
+    disk_cache.write_cache([('dp', 'coinstring', ['coins', 'tring'])], [('coins', 'coin')], path = path)
+    assert disk_cache.cached_segmentation('coinstring', 'dp') == ['coins', 'tring']
+    assert disk_cache.cached_segmentation('coinstring', 'greedy') is None
+    assert disk_cache.cached_lemma('coins') == 'coin'
+
+    monkeypatch.setattr(segmentation, 'SEGMENTER_VERSION', segmentation.SEGMENTER_VERSION + 1)
+    monkeypatch.setattr(disk_cache, '_connection_pid', None)
+    assert disk_cache.cached_segmentation('coinstring', 'dp') is None
+    assert disk_cache.cached_lemma('coins') is None
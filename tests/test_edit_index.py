@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+from core import utils
+from core.edit_index import EditDistanceIndex, one_step_form
+
+
+def random_name(rng):
+    return '-'.join(''.join(rng.choice('abcde') for _ in range(rng.randint(1, 5))) for _ in range(rng.randint(1, 4)))
+
+
+def random_variant(rng, name):
+    tokens = name.split('-')
+    rng.shuffle(tokens)
+    variant = '-'.join(tokens)
+    for _ in range(rng.randint(0, 2)):
+        if not variant: break
+        i = rng.randrange(len(variant))
+        edit = rng.choice(['delete', 'insert', 'replace', 'swap'])
+        if edit == 'delete': variant = variant[:i] + variant[i + 1:]
+        elif edit == 'insert': variant = variant[:i] + rng.choice('abcdef-') + variant[i:]
+        elif edit == 'replace': variant = variant[:i] + rng.choice('abcdef-') + variant[i + 1:]
+        else: variant = variant[:i] + variant[i + 1:i + 2] + variant[i] + variant[i + 2:]
+    return variant.strip('-') or name
+
+
+def test_within_matches_DL_dist():
+    rng = random.Random(0)
+    names = {random_name(rng) for _ in range(300)}
+    index = EditDistanceIndex(names)
+    for query in [random_variant(rng, rng.choice(sorted(names))) for _ in range(100)]:
+        query = one_step_form(query)
+        expected = {n: utils.DL_dist(one_step_form(n), query) for n in names}
+        assert index.within(query) == {n: d for n, d in expected.items() if d <= 2}
+
+
+def test_one_step_candidates_of_reordered_tokens():
+    index = EditDistanceIndex(['aaaa-bbbb-cccc-dddd'])
+    assert utils.permuted_DL_dist(one_step_form('aaaa-bbbb-cccc-dddd'), one_step_form('eaaa-fbbb-cccc-dddd').split('_')) == 2
+    assert index.one_step_candidates('eaaa-fbbb-cccc-dddd') == {'aaaa-bbbb-cccc-dddd'}
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_one_step_candidates_match_permuted_DL_dist(seed):
+    rng = random.Random(seed)
+    names = sorted({random_name(rng) for _ in range(200)})
+    index = EditDistanceIndex(names)
+    for adv in [random_variant(rng, rng.choice(names)) for _ in range(100)]:
+        expected = {n for n in names if utils.permuted_DL_dist(one_step_form(n), one_step_form(adv).split('_'))}
+        assert expected <= index.one_step_candidates(adv), adv
+
+
+def test_candidate_index_pairs_reordered_tokens(tmp_path, corpora):
+    from core.candidates import CandidateIndex
+    from core.incremental import load_index, save_index
+    save_index(CandidateIndex(['react', 'react-dom'], detectors = {1}), 'signature', str(tmp_path / 'popular.idx'))
+    loaded = load_index(str(tmp_path / 'popular.idx'), 'signature')
+    assert len(loaded.edits) == 2 and 'react-dom' in loaded.candidates('dom-raect')
@@ -0,0 +1,119 @@
+import os.path as osp
+import runpy
+import sys
+
+import pytest
+
+from core import incremental
+from core.incremental import DeltaStore, index_signature, load_index, save_index, load_or_build_index
+from core.sinks import read_records
+
+MAIN_PATH = osp.join(osp.dirname(osp.realpath(__file__)), '..', '__main__.py')
+BASE_PKGS = ['react', 'express', 'lodash', 'moment', 'chalk', 'webpack', '@babel/core']
+ADV_PKGS = ['reactt', 'expres', 'lodahs', 'momnet', 'chalk-cli', 'web-pack', 'babel-core', 'unrelated']
+
+
+def test_read_new_seeks_past_the_mark(tmp_path):
+    feed = tmp_path / 'feed.txt'
+    feed.write_text('reactt\nexpres\nlodahs')  # the last line is still being written
+    with DeltaStore(str(tmp_path / 'delta.sqlite'), 'fp') as store:
+        names, offset = store.read_new(str(feed))
+        assert names == ['reactt', 'expres'] and offset == len('reactt\nexpres\n')
+        store.advance(offset, 2, 1)
+        feed.write_text('reactt\nexpres\nlodahs\nmomnet\n')
+        assert store.read_new(str(feed)) == (['lodahs', 'momnet'], len(feed.read_text()))
+        feed.write_text('reactt\n')
+        with pytest.raises(ValueError):
+            store.read_new(str(feed))
+
+
+def test_other_fingerprint_is_refused(tmp_path):
+    path = str(tmp_path / 'delta.sqlite')
+    with DeltaStore(path, 'fp') as store:
+        store.advance(10, 2, 1)
+    with pytest.raises(ValueError):
+        DeltaStore(path, 'other fp')
+    with DeltaStore(path, 'fp') as store:
+        assert store.high_water_mark() == 10
+
+
+def test_unreadable_index_is_a_miss(tmp_path, corpora):
+    path = str(tmp_path / 'popular.idx')
+    signature = index_signature(BASE_PKGS)
+    index = load_or_build_index(path, BASE_PKGS)
+    assert load_index(path, signature).index == index.index
+    assert load_index(path, 'other signature') is None
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(data[:len(data) // 2])  # truncated pickle
+    assert load_index(path, signature) is None
+    with open(path, 'wb') as f:
+        f.write(signature.encode() + b'\nnot a pickle')
+    assert load_index(path, signature) is None
+    save_index(index, signature, path)
+    assert load_index(path, signature) is not None
+
+
+def test_index_version_is_signed(monkeypatch, corpora):
+    signature = index_signature(BASE_PKGS)
+    monkeypatch.setattr(incremental, 'INDEX_VERSION', incremental.INDEX_VERSION + 1)
+    assert index_signature(BASE_PKGS) != signature
+
+
+def run_main(tmp_path, monkeypatch, adv_file, *args):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'logs').mkdir(exist_ok = True)
+    base_file = tmp_path / 'base.txt'
+    base_file.write_text('\n'.join(BASE_PKGS) + '\n')
+    monkeypatch.setattr(sys, 'argv', ['typomind', str(base_file), str(adv_file), '-bf', '-af', '-q', *args])
+    runpy.run_path(MAIN_PATH, run_name = 'typomind')['main']()
+
+
+def pairs(path):
+    return sorted((r['base'], r['adversarial']) for r in read_records(str(path)))
+
+
+def test_delta_runs_equal_a_full_scan(tmp_path, monkeypatch, corpora):
+    adv_file = tmp_path / 'adv.txt'
+    adv_file.write_text('\n'.join(ADV_PKGS) + '\n')
+    run_main(tmp_path, monkeypatch, adv_file, '-of', 'full.jsonl')
+    expected = pairs(tmp_path / 'full.jsonl')
+    assert expected
+
+    feed = tmp_path / 'feed.txt'
+    delta_args = ('-dl', 'delta.sqlite', '-ix', 'popular.idx', '-of', 'out.jsonl')
+    feed.write_text('\n'.join(ADV_PKGS[:4]) + '\n')
+    run_main(tmp_path, monkeypatch, feed, *delta_args)
+    assert osp.isfile(tmp_path / 'popular.idx')
+    feed.write_text('\n'.join(ADV_PKGS) + '\n')
+    run_main(tmp_path, monkeypatch, feed, *delta_args)
+    assert pairs(tmp_path / 'out.jsonl') == expected
+    run_main(tmp_path, monkeypatch, feed, *delta_args)  # nothing new
+    assert pairs(tmp_path / 'out.jsonl') == expected
+
+    with pytest.raises(ValueError):  # other options, the outfile would mix results
+        run_main(tmp_path, monkeypatch, feed, *delta_args, '-d', '1')
+
+
+def test_delta_run_crashed_before_advancing_is_rolled_back(tmp_path, monkeypatch, corpora):
+    feed = tmp_path / 'feed.txt'
+    feed.write_text('\n'.join(ADV_PKGS) + '\n')
+    run_main(tmp_path, monkeypatch, feed, '-of', 'full.jsonl')
+    expected = pairs(tmp_path / 'full.jsonl')
+
+    delta_args = ('-dl', 'delta.sqlite', '-of', 'out.jsonl')
+    feed.write_text('\n'.join(ADV_PKGS[:4]) + '\n')
+    run_main(tmp_path, monkeypatch, feed, *delta_args)
+    feed.write_text('\n'.join(ADV_PKGS) + '\n')
+    # crash after the results of the second run were written but before the mark advanced
+    def crashing_advance(self, *args, **kwargs):
+        raise KeyboardInterrupt
+    with monkeypatch.context() as m:
+        m.setattr(DeltaStore, 'advance', crashing_advance)
+        with pytest.raises(KeyboardInterrupt):
+            run_main(tmp_path, m, feed, *delta_args)
+    assert pairs(tmp_path / 'out.jsonl') == expected  # written, the rerun would append them again
+
+    run_main(tmp_path, monkeypatch, feed, *delta_args)
+    assert pairs(tmp_path / 'out.jsonl') == expected
@@ -0,0 +1,26 @@
+import json
+
+import numpy as np
+
+from core import neighbors
+from core.neighbors import TokenNeighbors
+
+
+def test_exact_scan_matches_float64(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((1000, 32))
+    vectors /= np.linalg.norm(vectors, axis = 1, keepdims = True)
+    vectors[1] = vectors[0] + 0.01 * rng.standard_normal(32)  # a close neighbor of token 0
+    keys = [f'token{i}' for i in range(len(vectors))]
+    np.save(tmp_path / 'vectors.npy', vectors.astype(np.float16))
+    (tmp_path / 'keys.json').write_text(json.dumps(keys))
+    monkeypatch.setattr(neighbors, 'CHUNK_ROWS', 300)
+
+    index = TokenNeighbors(str(tmp_path / 'vectors.npy'), str(tmp_path / 'keys.json'), str(tmp_path / 'missing.hnsw'))
+    found = index.neighbors('token0', k = 5, threshold = -1)
+    stored = vectors.astype(np.float16).astype(np.float64)
+    similarities = stored @ stored[0]
+    expected = [keys[i] for i in np.argsort(-similarities) if i != 0][:5]
+    assert [t for t, _ in found] == expected
+    assert found[0][0] == 'token1' and np.isclose(found[0][1], similarities[1], atol = 1e-5)
+    assert index.neighbors('token0', k = 5) == found[:1]  # only token1 is above the similarity threshold
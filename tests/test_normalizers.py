@@ -0,0 +1,66 @@
+from itertools import product
+
+import pytest
+
+from core.normalizers import NormalizedPair, STAGES
+
+NAMES = ['react-dom', 'dom-react', 'reactdom', 'lodash', 'lodahs', 'color', 'colour', 'body-parser', 'body-parsers',
+         'coinstring', 'coin-strings', '@babel/core', 'babel-core', 'node-fetch', 'raect-dom', 'body-praser', 'fetch-nodes',
+         'react-dom-fetch', 'raect-parser', 'color-string', 'string-colour', '@babel/cor', '@types/nod', 'react-redux',
+         'raect-router', 'mime-db', 'mime-ds']
+
+
+def test_stage_paths_are_memoized(corpora):
+    pair = NormalizedPair('react-dom', 'dom_raect')
+    output = pair.stage(('one_step_LD_dist', 'delimiters'))
+    assert output == STAGES['delimiters'](*STAGES['one_step_LD_dist']('react-dom', 'dom_raect'))
+    assert pair.stage(('one_step_LD_dist',)) is pair._outputs[('one_step_LD_dist',)]
+    assert pair.stage(()) == ('react-dom', 'dom_raect')
+
+
+def test_lexical_stages():
+    assert STAGES['delimiters']('react.dom', 'dom-react') == ('react_dom', 'dom_react')
+    assert STAGES['scope']('@babel/core', 'babel-core') == ('core', 'babel-core')
+    assert STAGES['scope']('@types/node', '@typs/node') == ('node', 'node')
+    assert STAGES['shallow_sequence_order']('body-parser', 'parser_body') == ('body-parser', 'body_parser')
+    assert STAGES['shallow_sequence_order']('b.a-c', 'c_b') == ('a.b-c', 'b_c')
+
+
+# the normalization decorators of every detector before the stages were shared, outermost first
+BASELINE_DECORATORS = {
+    1: ('shallow_sequence_order', 'delimiters'),
+    2: ('delimiters',),
+    3: ('sequence_order', 'one_step_LD_dist'),
+    4: ('one_step_LD_dist', 'delimiters'),
+    5: ('sequence_order', 'delimiters'),
+    6: ('scope', 'one_step_LD_dist', 'delimiters'),
+    7: (),
+    8: ('one_step_LD_dist', 'delimiters'),
+    9: ('one_step_LD_dist', 'delimiters'),
+    10: ('sequence_order', 'delimiters'),
+    11: ('one_step_LD_dist', 'delimiters'),
+    13: ('delimiters',),
+}
+
+
+def baseline_detect(detector, base, adv):
+    """The detector applying its decorators one after the other, each on the output of the previous one."""
+    call = type(detector).__call__
+    if not BASELINE_DECORATORS[detector.key]: return call(detector, base, adv)
+    for stage in BASELINE_DECORATORS[detector.key]:
+        base, adv = STAGES[stage](base, adv)
+    return call.__wrapped__(detector, base, adv)
+
+
+def test_shared_stages_match_the_baseline_decorators(corpora):
+    from core.detectors import DetectorBase, classify_typosquat, is_unscoped
+    detectors = sorted(DetectorBase.enabled_inst_registry, key = lambda d: d.key)
+    assert {d.key for d in detectors} == set(BASELINE_DECORATORS)
+    for base, adv in product(NAMES, NAMES):
+        pair = NormalizedPair(base, adv)
+        expected = [baseline_detect(d, base, adv) for d in detectors]
+        assert [d.detect(pair) for d in detectors] == expected, (base, adv)
+        assert [d(base, adv) for d in detectors] == expected, (base, adv)
+        if is_unscoped(base, adv):
+            positives = {d.key: e for d, e in zip(detectors, expected) if e}
+            assert {key: count for (key, _), count in classify_typosquat(base, adv).items()} == positives, (base, adv)
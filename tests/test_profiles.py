@@ -0,0 +1,29 @@
+import pytest
+
+from core import utils
+from core.profiles import PackageProfile, get_profile, get_name
+
+NAMES = ['react', 'react-dom', 'body_parser', 'nodefetch', '@babel/core', 'socket.io', 'a-b.c_d']
+
+
+@pytest.mark.parametrize('name', NAMES)
+def test_profile_forms_match_utils(corpora, name):
+    profile = PackageProfile(name)
+    assert profile.delimited == utils.replace_delimiters(name, '_')
+    assert list(profile.sequence) == utils.to_sequence(name)
+    assert list(profile.shallow_sequence) == utils.to_sequence(name, deep = False)
+    assert list(profile.sorted_sequence) == utils.to_sorted_sequence(name)
+    assert profile.sorted_tokens == utils.sorted_tokens(name)
+    assert profile.shallow_sorted_tokens == utils.sorted_tokens(name, deep = False)
+
+
+def test_profiles_are_shared():
+    profile = get_profile('react')
+    assert get_profile('react') is profile and get_profile(profile) is profile
+    assert get_name(profile) == get_name('react') == 'react'
+
+
+def test_classify_accepts_profiles(corpora):
+    from core.detectors import classify_typosquat
+    for base, adv in [('react-dom', 'dom-react'), ('lodash', 'lodahs'), ('express', 'unrelated')]:
+        assert classify_typosquat(get_profile(base), get_profile(adv)) == classify_typosquat(base, adv)
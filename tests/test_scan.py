@@ -0,0 +1,25 @@
+from core.scan import scan, work_units, chunked
+
+BASE_PKGS = ['react', 'express', 'lodash', 'moment', 'chalk', 'webpack', '@babel/core']
+ADV_PKGS = ['reactt', 'expres', 'lodahs', 'momnet', 'chalk-cli', 'web-pack', 'babel-core', 'unrelated', 'l0dash']
+
+
+def summary(units):
+    return [(u.unit_id, u.num_pairs, sorted((r.base_pkg, r.adv_pkg, tuple(sorted(r.classifications.items()))) for r in u.results))
+            for u in units]
+
+
+def test_chunked():
+    assert list(chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_workers_match_a_single_process(corpora):
+    expected = summary(scan(work_units(BASE_PKGS, ADV_PKGS, unit_size = 3, exhaustive = True)))
+    assert sum(u[1] for u in expected) == len(BASE_PKGS) * len(ADV_PKGS)
+    assert any(u[2] for u in expected)
+    assert summary(scan(work_units(BASE_PKGS, ADV_PKGS, unit_size = 3, exhaustive = True), workers = 2, chunk_size = 2)) == expected
+
+
+def test_skipped_units(corpora):
+    units = [unit_id for unit_id, _ in work_units(BASE_PKGS, ADV_PKGS, unit_size = 3, skip = {1})]
+    assert units == [0, 2]
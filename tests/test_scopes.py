@@ -0,0 +1,55 @@
+from itertools import product
+
+from core.scopes import ScopeIndex, split_scope
+
+BASE_PKGS = ['@babel/core', '@babel/preset-env', '@types/node', '@angular/core', '@vue/cli', 'lodash', 'react-dom']
+ADV_PKGS = ['@babell/core', '@bable/preset-env', 'babel-core', '@typs/node', '@types/nodes', 'types-node', 'node', '@angullar/core',
+            '@angular/cli', '@vue-js/cli', 'core', '@lodash/lodash', 'lodash', '@react/dom', '@babel/core', 'unrelated']
+
+
+def scope_confusions(base_pkgs, adv_pkgs):
+    """Pairs ScopeConfusion flags after the delimiter normalization, the ones ScopeIndex finds."""
+    from core.detectors import ScopeConfusion
+    from core.profiles import get_profile
+    detector = ScopeConfusion.__call__.__wrapped__
+    return {(b, a) for b, a in product(base_pkgs, adv_pkgs)
+            if detector(ScopeConfusion(), get_profile(b).delimited, get_profile(a).delimited)}
+
+
+def imitations(index, adv_pkgs):
+    return {(b, a) for a in adv_pkgs for b in index.imitated(a)}
+
+
+def test_split_scope():
+    assert split_scope('@babel/core') == ('babel', 'core')
+    assert split_scope('core') == (None, 'core')
+
+
+def test_scope_index_matches_scope_confusion(corpora):
+    expected = scope_confusions(BASE_PKGS, ADV_PKGS)
+    assert ('@babel/core', '@babell/core') in expected and ('@types/node', 'node') in expected
+    assert imitations(ScopeIndex(BASE_PKGS), ADV_PKGS) == expected
+
+
+def test_added_scopes_keep_precomputed_relations(corpora):
+    index = ScopeIndex(BASE_PKGS[:2])
+    index.precompute(ADV_PKGS)
+    related = index.related
+    for base_pkg in BASE_PKGS[2:]:
+        index.add(base_pkg)
+    assert index.related is related and 'typs' in related
+    assert imitations(index, ADV_PKGS) == imitations(ScopeIndex(BASE_PKGS), ADV_PKGS)
+
+
+def test_scope_confusion_reads_the_registered_index(corpora, monkeypatch):
+    from core import detectors
+    pairs = [(b, a) for b, a in product(BASE_PKGS, ADV_PKGS) if '/' in b or '/' in a]
+    expected = {pair for pair in pairs if detectors.classify_typosquat(*pair, detectors = {11})}
+    assert expected
+    index = ScopeIndex(BASE_PKGS)
+    index.precompute(ADV_PKGS)
+    monkeypatch.setattr(detectors, '_scope_index', index)
+    def unexpected(*args):
+        raise AssertionError('scopes classified again')
+    monkeypatch.setattr(detectors, 'are_confusable', unexpected)
+    assert {pair for pair in pairs if detectors.classify_typosquat(*pair, detectors = {11})} == expected
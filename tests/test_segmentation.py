@@ -0,0 +1,39 @@
+import pytest
+
+from core import segmentation
+from core.profiles import get_profile
+
+
+@pytest.fixture
+def dp_segmenter(corpora):
+    segmentation.set_segmenter('dp')
+    yield segmentation
+    segmentation.set_segmenter('greedy')
+
+
+def test_set_segmenter_resets_profiles(dp_segmenter):
+    profile = get_profile('coinstring')
+    dp_segmenter.set_segmenter('greedy')
+    assert get_profile('coinstring') is not profile
+    with pytest.raises(ValueError):
+        dp_segmenter.set_segmenter('other')
+
+
+def long_token(corpora, tokens):
+    return min(t for t in tokens if len(t) >= 6 and t.isalpha() and t in corpora.EN_TOKENS)
+
+
+def test_dp_splits_into_corpus_tokens(dp_segmenter, corpora):
+    first = long_token(corpora, corpora.EN_TOKENS)
+    second = long_token(corpora, corpora.EN_TOKENS - {first})
+    assert dp_segmenter.segment_dp(first + second) == [first, second]
+    assert dp_segmenter.segment_dp(first) == [first]
+    assert dp_segmenter.segment_dp('qzxv') == ['qzxv']
+
+
+def test_dp_accepts_inflections(dp_segmenter, corpora):
+    inflected = sorted(t for t, lemma in corpora.LEMMAS.items() if lemma in corpora.EN_TOKENS and len(t) > 4
+                       and t not in corpora.ALL_TOKENS and t.isalpha())
+    if not inflected: pytest.skip('no inflected words outside the token corpora')
+    first = long_token(corpora, corpora.EN_TOKENS)
+    assert dp_segmenter.segment_dp(first + inflected[0]) == [first, inflected[0]]
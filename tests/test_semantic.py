@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from core import semantic
+
+
+@pytest.fixture(scope = 'module')
+def words():
+    """A few words of the word vector model, skips when it (or gensim) is not available."""
+    try:
+        word_vector = semantic.get_word_vector()
+    except (ImportError, OSError) as e:
+        pytest.skip(f'word vectors not available: {e}')
+    return list(word_vector.index_to_key[:12]) + ['not-a-word-of-the-model']
+
+
+def test_model_is_loaded_lazily(monkeypatch):
+    monkeypatch.setattr(semantic, '_word_vector', None)
+    monkeypatch.setattr(semantic, 'MODEL_PATH', semantic.MODEL_PATH)
+    semantic.set_model_path('/nonexistent/vectors.kv')
+    assert semantic._word_vector is None  # nothing is opened until a similarity is needed
+
+
+def test_similarity_matrix_matches_get_similarity(words):
+    matrix = semantic.similarity_matrix(words, words[::-1])
+    expected = [[semantic.get_similarity(a, b) for b in words[::-1]] for a in words]
+    assert np.allclose(matrix, expected, atol = 1e-5)
+
+
+def test_batched_similarity_matches_pairwise(words):
+    token_pairs = [(words[:2], words[2:4]), (words[4:5], words[5:8]), (words[:3], words[:3]), (words[8:9], words[-1:])]
+    assert list(semantic.are_semantically_similar(token_pairs)) == [semantic.is_semantically_similar(b, a) for b, a in token_pairs]
+    assert np.isnan(semantic.similarity_ratios(token_pairs)[2])
@@ -0,0 +1,105 @@
+import http.client
+import json
+import socket
+import threading
+
+import pytest
+
+from core import server
+from core.server import DetectionService, make_server
+
+BASE_PKGS = ['react', 'express', 'lodash', '@babel/core', '@types/node']
+
+
+class UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path: str) -> None:
+        super().__init__('localhost')
+        self.path = path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+def request(connection, method, path, body = None, headers = {}):
+    connection.request(method, path, body = json.dumps(body) if isinstance(body, dict) else body, headers = headers)
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+@pytest.fixture
+def serve(corpora):
+    """Starts a server on a free localhost port (or a Unix socket) and returns a connection to it."""
+    started = []
+
+    def start(unix_socket = None, **service_kwargs):
+        service = DetectionService(BASE_PKGS, **service_kwargs)
+        httpd = make_server(service, port = 0, unix_socket = unix_socket)
+        threading.Thread(target = httpd.serve_forever, daemon = True).start()
+        started.append((httpd, service))
+        connection = UnixConnection(unix_socket) if unix_socket else http.client.HTTPConnection('127.0.0.1', httpd.server_port, timeout = 30)
+        connection.service = service
+        return connection
+
+    yield start
+    for httpd, service in started:
+        httpd.shutdown()
+        httpd.server_close()
+        service.close()
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_classify_and_imitates(serve, workers):
+    from core.detectors import classify_typosquat
+    connection = serve(workers = workers)
+    assert request(connection, 'GET', '/health') == (200, {'status': 'ok', 'base_pkgs': len(BASE_PKGS)})
+    status, body = request(connection, 'POST', '/classify', {'pairs': [['lodash', 'lodahs'], ['react', 'unrelated']]})
+    assert status == 200 and [len(r['detectors']) > 0 for r in body['results']] == [True, False]
+
+    status, body = request(connection, 'POST', '/imitates', {'names': ['lodahs', '@babell/core', 'types-node', 'unrelated']})
+    assert status == 200
+    found = {adv: {r['base'] for r in results} for adv, results in body['results'].items()}
+    expected = {adv: {b for b in BASE_PKGS if classify_typosquat(b, adv)} for adv in found}
+    assert found == expected and '@babel/core' in found['@babell/core']
+
+
+def test_unix_socket(serve, tmp_path):
+    connection = serve(unix_socket = str(tmp_path / 'typomind.sock'))
+    status, body = request(connection, 'POST', '/classify', {'base': 'express', 'adv': 'expres'})
+    assert status == 200 and body['results'][0]['detectors']
+
+
+def test_bad_requests(serve):
+    connection = serve(batch_size = 2)
+    assert request(connection, 'POST', '/classify', {'pairs': [['a', 'b']] * 3})[0] == 400
+    assert request(connection, 'POST', '/classify', {'base': 1, 'adv': 'b'})[0] == 400
+    assert request(connection, 'POST', '/classify', '[]')[0] == 400
+    assert request(connection, 'POST', '/classify', '{}', headers = {'Content-Length': '-1'})[0] == 400
+    assert request(connection, 'POST', '/unknown', {})[0] == 404
+
+
+def test_imitates_queues_more_pairs_than_a_batch(serve):
+    from core.detectors import classify_typosquat
+    connection = serve(batch_size = 2)
+    names = ['lodahs', 'reactt', 'expres', '@babell/core', 'types-node', 'react-lodash']
+    assert sum(len(connection.service.index.candidates(n)) for n in names) > 2
+    status, body = request(connection, 'POST', '/imitates', {'names': names})
+    assert status == 200
+    found = {adv: {r['base'] for r in results} for adv, results in body['results'].items()}
+    assert found == {adv: {b for b in BASE_PKGS if classify_typosquat(b, adv)} for adv in names}
+
+
+def dying_classify_pairs(pairs, classify_kwargs):
+    if ('react', 'crash') in pairs: raise SystemExit  # the worker dies, its task is lost
+    return classify_pairs(pairs, classify_kwargs)
+
+classify_pairs = server.classify_pairs
+
+
+def test_lost_batches_fail_and_restart_the_workers(serve, monkeypatch):
+    monkeypatch.setattr(server, 'classify_pairs', dying_classify_pairs)  # before the workers are forked
+    connection = serve(workers = 2, batch_timeout = 2)
+    assert request(connection, 'POST', '/classify', {'base': 'react', 'adv': 'crash'})[0] == 503
+    status, body = request(connection, 'POST', '/classify', {'base': 'lodash', 'adv': 'lodahs'})
+    assert status == 200 and body['results'][0]['detectors']
+    assert connection.service.pool._ctx.get_start_method() == 'forkserver'  # never forked from the threaded server
@@ -0,0 +1,74 @@
+import os
+import runpy
+import subprocess
+import sys
+import os.path as osp
+from itertools import product
+
+import pytest
+
+from core.scan import fingerprint, in_shard, parse_shard, shard
+from core.sinks import open_sink, read_records
+
+MERGE_PATH = osp.join(osp.dirname(osp.realpath(__file__)), '..', 'tools', 'merge_results.py')
+BASE_PKGS = {f'base-{i}' for i in range(50)}
+ADV_PKGS = {f'adv-{i}' for i in range(200)}
+
+
+def test_parse_shard():
+    assert parse_shard('3/10') == (3, 10)
+    for spec in ('10/10', '-1/4', '1', 'a/b'):
+        with pytest.raises(ValueError):
+            parse_shard(spec)
+
+
+@pytest.mark.parametrize('num_shards', [1, 3, 7])
+def test_shards_partition_the_cross_product(num_shards):
+    pairs = [set(product(*shard(BASE_PKGS, ADV_PKGS, i, num_shards))) for i in range(num_shards)]
+    assert set().union(*pairs) == set(product(BASE_PKGS, ADV_PKGS))
+    assert sum(map(len, pairs)) == len(BASE_PKGS) * len(ADV_PKGS)
+
+
+def test_shard_is_stable_across_processes():
+    """Unlike hash(), the shard of a name must not change with the hash seed of the process."""
+    code = ('import sys; sys.path.insert(0, sys.argv[1]); from core.scan import in_shard; '
+            'print([i for i in range(200) if in_shard(f"adv-{i}", 2, 5)])')
+    repo = osp.join(osp.dirname(osp.realpath(__file__)), '..')
+    outputs = {subprocess.run([sys.executable, '-c', code, repo], env = dict(os.environ, PYTHONHASHSEED = seed),
+                              capture_output = True, text = True, check = True).stdout for seed in ('1', '2')}
+    assert outputs == {f'{[i for i in range(200) if in_shard(f"adv-{i}", 2, 5)]}\n'}
+
+
+def test_fingerprint():
+    assert fingerprint(['a', 'b'], ['c'], 1000, False) == fingerprint(['b', 'a'], ['c'], 1000, False)
+    assert fingerprint(['a', 'b'], ['c'], 1000, False) != fingerprint(['a', 'b'], ['c'], 100, False)
+    assert fingerprint(['a'], ['b', 'c'], 1000) != fingerprint(['a', 'b'], ['c'], 1000)
+
+
+def record(base, adv, detectors = (1,)):
+    return {'base': base, 'adversarial': adv, 'detectors': list(detectors), 'counts': [1] * len(detectors), 'elapsed_ms': 0.5}
+
+
+def run_merge(monkeypatch, *args):
+    monkeypatch.setattr(sys, 'argv', ['merge_results.py', *args])
+    runpy.run_path(MERGE_PATH, run_name = 'merge_results')['main']()
+
+
+def test_merge_sorts_and_dedups(tmp_path, monkeypatch):
+    shards = {'0.jsonl': [record('react', 'raect'), record('lodash', 'lodahs')], '1.csv': [record('express', 'expres'), record('react', 'raect')]}
+    for name, records in shards.items():
+        with open_sink(str(tmp_path / name)) as sink:
+            for r in records: sink.write_record(r)
+    run_merge(monkeypatch, str(tmp_path / '0.jsonl'), str(tmp_path / '*.csv'), str(tmp_path / 'merged.jsonl'))
+    assert [(r['base'], r['adversarial']) for r in read_records(str(tmp_path / 'merged.jsonl'))] == \
+        [('express', 'expres'), ('lodash', 'lodahs'), ('react', 'raect')]
+
+
+def test_merge_refuses_unstructured_output(tmp_path, monkeypatch):
+    with open_sink(str(tmp_path / '0.jsonl')) as sink:
+        sink.write_record(record('react', 'raect'))
+    output = tmp_path / 'merged.jsonll'
+    output.write_text('keep me')
+    with pytest.raises(SystemExit):
+        run_merge(monkeypatch, str(tmp_path / '0.jsonl'), str(output))
+    assert output.read_text() == 'keep me'
@@ -0,0 +1,70 @@
+from datetime import timedelta
+from typing import Dict, NamedTuple
+
+import pytest
+
+from core.sinks import ResultSink, ParquetSink, open_sink, read_records, sink_format, to_record
+
+
+
+class ScanResult(NamedTuple):  # same fields as core.scan.ScanResult, which would load the detectors
+    base_pkg: str
+    adv_pkg: str
+    classifications: Dict
+    elapsed: timedelta
+
+
+RESULTS = [
+    ScanResult('react', 'raect', {(1, '1-step D-L dist'): 1}, timedelta(milliseconds = 2)),
+    ScanResult('express', 'expres', {(13, 'homophonic similarity'): 1, (1, '1-step D-L dist'): 1}, timedelta(microseconds = 500)),
+]
+
+
+@pytest.mark.parametrize('ext', ['jsonl', 'csv'])
+def test_records_round_trip(tmp_path, ext):
+    path = str(tmp_path / f'out.{ext}')
+    with open_sink(path, batch_size = 1) as sink:
+        for result in RESULTS:
+            sink.write(result)
+    assert list(read_records(path)) == [to_record(r) for r in RESULTS]
+
+
+@pytest.mark.parametrize('ext', ['jsonl', 'csv'])
+def test_append_keeps_earlier_records(tmp_path, ext):
+    path = str(tmp_path / f'out.{ext}')
+    for result in RESULTS:
+        with open_sink(path, append = True) as sink:
+            sink.write(result)
+    assert list(read_records(path)) == [to_record(r) for r in RESULTS]
+    with open_sink(path, append = False) as sink:
+        sink.write(RESULTS[0])
+    assert list(read_records(path)) == [to_record(RESULTS[0])]
+
+
+def test_format_inference():
+    assert sink_format('out.json') == 'jsonl'
+    assert sink_format('out.CSV') == 'csv'
+    assert sink_format('out.log') == 'txt'
+    assert sink_format('out.log', 'parquet') == 'parquet'
+
+
+def test_base_class_is_abstract(tmp_path):
+    with pytest.raises(TypeError):
+        ResultSink(str(tmp_path / 'out'))
+
+
+def test_parquet_refuses_to_append(tmp_path):
+    path = tmp_path / 'out.parquet'
+    path.write_bytes(b'existing')
+    with pytest.raises(ValueError):
+        ParquetSink(str(path), append = True)
+    assert path.read_bytes() == b'existing'
+
+
+def test_close_releases_the_file_after_a_failed_batch(tmp_path):
+    path = str(tmp_path / 'out.jsonl')
+    sink = open_sink(path)
+    sink.write_record({'not json': object()})
+    with pytest.raises(TypeError):
+        sink.close()
+    assert sink._file.closed and not sink._thread.is_alive()
@@ -0,0 +1,29 @@
+import subprocess
+import sys
+import os.path as osp
+
+from core import tokens
+
+REPO_PATH = osp.join(osp.dirname(osp.realpath(__file__)), '..')
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / 'corpora.snapshot')
+    snapshot = {'en_tokens': {'react', 'color'}, 'lemmas': {'colors': 'color'}}
+    tokens.write_snapshot(snapshot, 'signature', path = path)
+    assert tokens.read_snapshot('signature', path = path) == snapshot
+    assert tokens.read_snapshot('other signature', path = path) is None
+    assert tokens.read_snapshot('signature', path = str(tmp_path / 'missing')) is None
+
+
+def test_lazy_corpora(corpora):
+    assert corpora.ALL_TOKENS == corpora.PKG_TOKENS | corpora.EN_TOKENS
+    assert set(corpora.PHONETIC_KEYS) >= corpora.ALL_TOKENS
+
+
+def test_corpus_lemmas_need_no_wordnet(corpora):
+    script = ('from core import tokens, nlp_tools\n'
+              'words = sorted(tokens.LEMMAS)[:1000]\n'
+              'assert [nlp_tools.lemmatize(w) for w in words] == [tokens.LEMMAS[w] for w in words]\n'
+              'assert nlp_tools.LEMMATIZER is None\n')
+    subprocess.run([sys.executable, '-c', script], cwd = REPO_PATH, check = True)
@@ -0,0 +1,70 @@
+import random
+from itertools import permutations
+
+import pytest
+
+from core import utils
+
+
+def brute_force_permuted_DL_dist(target, tokens, max_dist = 2, sep = '_'):
+    for p in permutations(tokens):
+        dist = utils.DL_dist(target, sep.join(p))
+        if 1 <= dist <= max_dist: return dist
+    return 0
+
+
+def random_edit(rng, target):
+    i = rng.randrange(len(target))
+    edit = rng.choice(['delete', 'insert', 'replace', 'swap'])
+    if edit == 'delete': return target[:i] + target[i + 1:]
+    if edit == 'insert': return target[:i] + rng.choice('abcx_') + target[i:]
+    if edit == 'replace': return target[:i] + rng.choice('abcx') + target[i + 1:]
+    return target[:i] + target[i + 1:i + 2] + target[i] + target[i + 2:]
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_permuted_DL_dist_matches_permutations(seed):
+    rng = random.Random(seed)
+    for _ in range(50):
+        tokens = [''.join(rng.choice('abcd') for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 4))]
+        target = '_'.join(rng.sample(tokens, len(tokens)))
+        for _ in range(rng.randint(0, 3)):
+            if target: target = random_edit(rng, target)
+        assert utils.permuted_DL_dist(target, tokens) == brute_force_permuted_DL_dist(target, tokens), (target, tokens)
+
+
+def test_permuted_DL_dist_long_sequences():
+    tokens = ['alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf', 'hotel', 'india', 'juliett']
+    assert utils.permuted_DL_dist('_'.join(reversed(tokens)) + 'x', tokens) == 1  # 10! permutations
+    assert utils.permuted_DL_dist('_'.join(tokens), tokens) == 0
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_is_permuted_concatenation_matches_permutations(seed):
+    rng = random.Random(seed)
+    for _ in range(100):
+        tokens = [''.join(rng.choice('ab') for _ in range(rng.randint(1, 3))) for _ in range(rng.randint(1, 5))]
+        target = ''.join(rng.sample(tokens, len(tokens)))
+        if rng.random() < 0.5: target = random_edit(rng, target)
+        expected = target in {''.join(p) for p in permutations(tokens)}
+        assert utils.is_permuted_concatenation(target, tokens) == expected, (target, tokens)
+
+
+def test_delimiter_modification_matches_permutation_sets(corpora):
+    from core.detectors import DelimiterModification, match_delimiter_modifications
+    from core.profiles import get_profile
+
+    def permutation_sets(base_pkg, adversarial_pkg):  # the detector before canonical keys
+        base_sequence, adversarial_sequence = get_profile(base_pkg).sequence, get_profile(adversarial_pkg).sequence
+        matched = ''.join(adversarial_sequence) in {''.join(p) for p in permutations(base_sequence)} \
+            or ''.join(base_sequence) in {''.join(p) for p in permutations(adversarial_sequence)}
+        return 1 if matched and base_pkg != adversarial_pkg else 0
+
+    names = ['react-dom', 'reactdom', 'dom-react', 'react_dom', 'body-parser', 'bodyparser', 'parser.body', 'node-fetch',
+             'fetchnode', 'socket.io', 'socketio', 'iosocket', 'react', 'lodash', 'lo-dash', 'dash-lo']
+    detector = DelimiterModification()
+    canonical_keys = DelimiterModification.__call__.__wrapped__  # without the normalization shared by both versions
+    expected = {(b, a) for b in names for a in names if permutation_sets(b, a)}
+    assert expected
+    assert {(b, a) for b in names for a in names if canonical_keys(detector, b, a)} == expected
+    assert set(match_delimiter_modifications(names, names)) == {(b, a) for b in names for a in names if detector(b, a)}
@@ -0,0 +1,46 @@
+"""
+Fills the persistent segmentation and lemma cache (core/disk_cache.py), e.g. once before submitting a cluster job, for
+every token of the given package lists and every corpus token.
+"""
+
+import sys
+import os.path as osp
+sys.path.append(osp.join(osp.dirname(osp.realpath(__file__)), '..'))
+import argparse
+import time
+
+from core import tokens, nlp_tools, segmentation, disk_cache
+from core.utils import replace_delimiters
+
+
+def make_argparser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description = 'build the persistent segmentation and lemma cache')
+    parser.add_argument('pkg_files', nargs = '*', default = [osp.join('data', 'test', 'npm_popular.csv')], help='paths to lists of pkgs (default data/test/npm_popular.csv)')
+    parser.add_argument('--segmenters', '-seg', nargs = '+', choices = segmentation.SEGMENTERS, default = list(segmentation.SEGMENTERS), help='segmenters to cache (default all)')
+    return parser
+
+
+def main() -> None:
+    args = make_argparser().parse_args()
+    start = time.time()
+    names = set()
+    for path in args.pkg_files:
+        with open(path, 'r') as f:
+            for pkg in f:
+                names |= set(replace_delimiters(pkg.strip(), ' ').split())
+
+    segments = []
+    for segmenter in args.segmenters:
+        segmentation.set_segmenter(segmenter)
+        segments += [(segmenter, name, segmentation.segment(name)) for name in sorted(names)]
+    lemmatizer = nlp_tools.get_lemmatizer()
+    lemma_tokens = tokens.ALL_TOKENS | names | {t for _, _, sequence in segments for t in sequence}
+    lemmas = [(token, lemmatizer.lemmatize(token)) for token in sorted(lemma_tokens)]
+
+    disk_cache.write_cache(segments, lemmas)
+    print(f'Cached {len(segments)} segmentations of {len(names)} names and {len(lemmas)} lemmas into '
+          f'{disk_cache.CACHE_PATH} in {time.time() - start:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+"""
+Builds the corpus snapshot loaded by core/tokens.py, e.g. once before submitting a cluster job.
+"""
+
+import sys
+import os.path as osp
+sys.path.append(osp.join(osp.dirname(osp.realpath(__file__)), '..'))
+import argparse
+import time
+
+
+def make_argparser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description = 'build the derived token corpora snapshot')
+    parser.add_argument('--force', '-f', action='store_const', const=True, help='rebuild even if the snapshot is up to date')
+    return parser
+
+
+def main() -> None:
+    parser = make_argparser()
+    args = parser.parse_args()
+
+    from core import tokens  # importing builds a missing or stale snapshot
+    if args.force:
+        tokens.write_snapshot(tokens.build_snapshot(), tokens.source_signature())
+
+    start = time.time()
+    snapshot = tokens.read_snapshot(tokens.source_signature())
+    print(f'{tokens.SNAPSHOT_PATH}: {osp.getsize(tokens.SNAPSHOT_PATH) / 1e6:.1f} MB, loads in {time.time() - start:.3f}s')
+    print(f'{len(snapshot["pkg_token_sorted_rank"])} package tokens, {len(snapshot["en_tokens"])} english tokens, {len(snapshot["phonetic_keys"])} phonetic keys')
+
+
+if __name__ == '__main__':
+    main()
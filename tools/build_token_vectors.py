@@ -0,0 +1,57 @@
+"""
+Builds the compact token vectors used by core/neighbors.py from the full fastText model: only the corpus tokens are
+kept, normalized and stored as float16, plus an HNSW index over them when hnswlib is installed.
+"""
+
+import sys
+import os.path as osp
+sys.path.append(osp.join(osp.dirname(osp.realpath(__file__)), '..'))
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from core import tokens, semantic, neighbors
+
+
+def make_argparser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description = 'restrict the fastText vectors to the corpus tokens and index them')
+    parser.add_argument('--vectors', '-vec', help='path to the saved fastText KeyedVectors (default core/models/fasttext-vectors.kv)')
+    parser.add_argument('--no_index', action='store_const', const=True, help='only write the float16 vectors, not the HNSW index')
+    parser.add_argument('--ef_construction', type=int, default=200, help='HNSW build-time accuracy/speed trade-off')
+    parser.add_argument('--M', type=int, default=16, help='HNSW number of links per node')
+    return parser
+
+
+def main() -> None:
+    args = make_argparser().parse_args()
+    if args.vectors:
+        semantic.set_model_path(args.vectors)
+
+    start = time.time()
+    word_vector = semantic.get_word_vector()
+    keys = sorted(t for t in tokens.corpora['all'] if t in word_vector.key_to_index)
+    vectors = np.stack([word_vector.get_vector(k, norm = True) for k in keys]).astype(np.float16)
+    os.makedirs(osp.dirname(neighbors.VECTORS_PATH), exist_ok = True)
+    np.save(neighbors.VECTORS_PATH, vectors)
+    with open(neighbors.KEYS_PATH, 'w') as f:
+        json.dump(keys, f)
+    print(f'{len(keys)} of {len(tokens.corpora["all"])} corpus tokens, {vectors.nbytes / 1e6:.1f} MB '
+          f'(full model {word_vector.vectors.nbytes / 1e6:.1f} MB) in {time.time() - start:.1f}s')
+
+    if args.no_index: return
+    if neighbors.hnswlib is None:
+        print('hnswlib is not installed, core/neighbors.py falls back to an exact scan')
+        return
+    start = time.time()
+    index = neighbors.hnswlib.Index(space = 'ip', dim = vectors.shape[1])
+    index.init_index(max_elements = len(keys), ef_construction = args.ef_construction, M = args.M)
+    index.add_items(vectors.astype(np.float32), np.arange(len(keys)))
+    index.save_index(neighbors.HNSW_PATH)
+    print(f'HNSW index over {len(keys)} tokens in {time.time() - start:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Merges the outputs of sharded runs (__main__.py --shard i/N) into one result file, sorted by (base, adversarial) with
+duplicate pairs dropped.
+"""
+
+import sys
+import os.path as osp
+sys.path.append(osp.join(osp.dirname(osp.realpath(__file__)), '..'))
+import argparse
+from glob import glob
+
+from core.sinks import open_sink, read_records, sink_format, TextSink
+
+
+def make_argparser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description = 'merge and dedup sharded detector outputs')
+    parser.add_argument('input_paths', nargs = '+', help = 'shard outputs or glob patterns, currently supports *.jsonl, *.csv and *.parquet')
+    parser.add_argument('output_path', help = 'path to merged output, format follows the extension')
+    return parser
+
+
+def main() -> None:
+    parser = make_argparser()
+    args = parser.parse_args()
+
+    input_paths = sorted({path for pattern in args.input_paths for path in (glob(pattern) or [pattern])})
+    output_path: str = args.output_path
+    if sink_format(output_path) == TextSink.ext:  # checked before anything is read or the output truncated
+        parser.error(f'"{output_path}" is not a structured result file, expected a *.jsonl, *.csv or *.parquet output')
+    if osp.abspath(output_path) in {osp.abspath(p) for p in input_paths}:
+        parser.error(f'"{output_path}" is also an input')
+
+    merged = {}
+    num_read = 0
+    for path in input_paths:
+        for record in read_records(path):
+            num_read += 1
+            merged.setdefault((record['base'], record['adversarial']), record)
+
+    with open_sink(output_path, append = False) as sink:
+        for key in sorted(merged):
+            sink.write_record(merged[key])
+    print(f'Merged {num_read} records from {len(input_paths)} files into {len(merged)} unique pairs')
+
+
+if __name__ == '__main__':
+    main()
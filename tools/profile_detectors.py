@@ -0,0 +1,72 @@
+"""
+Measures the mean time each detector takes per pair, the source of the `cost` attributes in core/detectors.py.
+
+Every pair is first classified once by all detectors so that the shared package profiles (segmentation, lemmas) are
+cached, then each detector is timed on its own over the same pairs.
+"""
+
+import sys
+import os.path as osp
+sys.path.append(osp.join(osp.dirname(osp.realpath(__file__)), '..'))
+import argparse
+import random
+import time
+from itertools import islice
+
+from core.detectors import DetectorBase, classify_typosquat, is_unscoped
+from core.candidates import candidate_pairs
+from core.profiles import get_profile
+
+
+def make_argparser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description = 'time every detector over the candidate pairs of two package lists')
+    parser.add_argument('base_file', help='path to list of base pkgs')
+    parser.add_argument('adv_file', help='path to list of adv pkgs')
+    parser.add_argument('--max_pairs', '-n', type=int, default=10000, help='number of candidate pairs to time')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the adv pkg sample')
+    parser.add_argument('--repeat', '-r', type=int, default=3, help='number of timed passes, the fastest one is reported')
+    return parser
+
+
+def main() -> None:
+    args = make_argparser().parse_args()
+    with open(args.base_file, 'r') as f:
+        base_pkgs = sorted({pkg.strip() for pkg in f if pkg.strip()})
+    with open(args.adv_file, 'r') as f:
+        adv_pkgs = sorted({pkg.strip() for pkg in f if pkg.strip()})
+    random.Random(args.seed).shuffle(adv_pkgs)  # the sorted list starts with the scoped names
+    pairs = [(get_profile(b), get_profile(a)) for b, a in islice(candidate_pairs(base_pkgs, adv_pkgs), args.max_pairs)]
+
+    detectors = {d.key: d for d in DetectorBase.enabled_inst_registry | DetectorBase.scoped_inst_registry}
+    hits = dict.fromkeys(detectors, 0)
+    valid_pairs = []
+    for base_pkg, adv_pkg in pairs:
+        try:
+            classifications = classify_typosquat(base_pkg, adv_pkg)
+        except Exception:  # logged as errors by the scan, not worth timing
+            continue
+        valid_pairs.append((base_pkg, adv_pkg))
+        for key, _ in classifications:
+            hits[key] += 1
+    pairs = valid_pairs
+
+    timings = []
+    for detector in detectors.values():
+        scoped = detector.is_scoped
+        detector_pairs = [(b, a) for b, a in pairs if scoped or is_unscoped(b.name, a.name)]
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for base_pkg, adv_pkg in detector_pairs:
+                detector(base_pkg, adv_pkg)
+            best = min(best, time.perf_counter() - start)
+        timings.append((best / max(1, len(detector_pairs)) * 1e6, detector))
+
+    print(f'{len(pairs)} pairs')
+    print(f'{"key":>4} {"name":<30} {"us/pair":>10} {"cost":>6} {"hits":>8}')
+    for us, detector in sorted(timings, key = lambda t: t[0]):
+        print(f'{detector.key:>4} {detector.name:<30} {us:>10.1f} {detector.cost:>6} {hits[detector.key]:>8}')
+
+
+if __name__ == '__main__':
+    main()
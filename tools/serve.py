@@ -0,0 +1,70 @@
+"""
+Runs the detection server (core/server.py), e.g. for a registry publish hook:
+
+    $ python3 tools/serve.py data/test/npm_popular.csv --port 8765 --workers 4
+    $ curl -s localhost:8765/imitates -d '{"name": "expres"}'
+"""
+
+import sys
+import os.path as osp
+sys.path.append(osp.join(osp.dirname(osp.realpath(__file__)), '..'))
+import argparse
+import logging
+import time
+
+from core import semantic, segmentation
+from core.detectors import parse_detector_keys
+from core.server import DetectionService, make_server
+
+
+def make_argparser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description = 'serve classify and imitates requests with all models and indexes loaded')
+    parser.add_argument('base_file', help='path to list of base (popular) pkgs')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', '-p', type=int, default=8765, help='port to listen on')
+    parser.add_argument('--socket', '-s', help='listen on this Unix socket instead of host:port')
+    parser.add_argument('--workers', '-w', type=int, default=1, help='number of forked worker processes')
+    parser.add_argument('--batch_size', '-bs', type=int, default=1000, help='max number of pairs classified together, and per classify request')
+    parser.add_argument('--batch_wait', '-bw', type=float, default=5, help='ms to wait for more requests to batch with')
+    parser.add_argument('--batch_timeout', '-bt', type=float, default=60, help='s after which a batch fails and the workers are restarted')
+    parser.add_argument('--detectors', '-d', help='comma separated keys of the detectors to run, e.g. 1,3,7 (all by default)')
+    parser.add_argument('--early_exit', '-ee', action='store_const', const=True, help='stop at the first positive detector of a pair, cheapest first')
+    parser.add_argument('--skip_expensive', '-se', action='store_const', const=True, help='skip the expensive (semantic) detectors once a cheaper one is positive')
+    parser.add_argument('--segmenter', '-seg', choices=segmentation.SEGMENTERS, help='how delimiter-less names are split into tokens (default greedy)')
+    parser.add_argument('--vectors', '-vec', help='path to the saved fastText KeyedVectors (default core/models/fasttext-vectors.kv)')
+    return parser
+
+
+def main() -> None:
+    argparser = make_argparser()
+    args = argparser.parse_args()
+    try:
+        detectors = parse_detector_keys(args.detectors) if args.detectors else None
+    except ValueError as e:
+        argparser.error(str(e))
+    if args.vectors:
+        semantic.set_model_path(args.vectors)
+    if args.segmenter:
+        segmentation.set_segmenter(args.segmenter)
+    logging.basicConfig(level = logging.INFO, format = '%(asctime)s %(levelname)s %(message)s')
+
+    start = time.time()
+    with open(args.base_file, 'r') as f:
+        base_pkgs = {pkg.strip() for pkg in f}
+    service = DetectionService(base_pkgs, workers = args.workers, batch_size = args.batch_size, batch_wait = args.batch_wait / 1000,
+                               batch_timeout = args.batch_timeout,
+                               detectors = detectors, early_exit = bool(args.early_exit), skip_expensive = bool(args.skip_expensive))
+    server = make_server(service, host = args.host, port = args.port, unix_socket = args.socket)
+    logging.info(f'Loaded {len(service.base_pkgs)} base pkgs in {time.time() - start:.1f}s, '
+                 f'listening on {args.socket or f"{args.host}:{server.server_port}"}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == '__main__':
+    main()